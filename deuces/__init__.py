@@ -1,3 +1,4 @@
 from .card import Card 
 from .deck import Deck 
-from .evaluator import Evaluator 
+from .evaluator import Evaluator, get_evaluator
+from .lookup import LookupTable, get_lookup_table
@@ -1,4 +1,5 @@
 from random import shuffle
+import numpy as np
 from .card import Card
 
 class Deck:
@@ -6,16 +7,25 @@ class Deck:
     Class representing a deck. The first time we create, we seed the static 
     deck with the list of unique card integers. Each object instantiated simply
     makes a copy of this object and shuffles it. 
+
+    A deck made with a seed (an int or a numpy SeedSequence, e.g. one of 
+    SeedSequence(seed).spawn(n) per worker) shuffles with its own numpy 
+    Generator, so its deals are reproducible and independent of any other 
+    deck's. Without one it shuffles with the global random.shuffle.
     """
     _FULL_DECK = []
 
-    def __init__(self):
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed) if seed is not None else None
         self.shuffle()
 
     def shuffle(self):
         # and then shuffle
         self.cards = Deck.GetFullDeck()
-        shuffle(self.cards)
+        if self.rng is not None:
+            self.rng.shuffle(self.cards)
+        else:
+            shuffle(self.cards)
 
     def draw(self, n=1):
         if n == 1:
@@ -40,3 +50,26 @@ class Deck:
                 Deck._FULL_DECK.append(Card.new(rank + suit))
 
         return list(Deck._FULL_DECK)
+
+    @staticmethod
+    def GetCombinations(cards, n):
+        """
+        Returns every n card combination of cards as a (C(len(cards), n), n) 
+        array, in the same order as itertools.combinations, built with array 
+        operations instead of one Python tuple per combination.
+        """
+        cards = np.asarray(cards, dtype=np.int64)
+        if n == 0:
+            return np.empty((1, 0), dtype=np.int64)
+
+        # grow the combinations of card indices one column at a time
+        combos = np.arange(len(cards)).reshape(-1, 1)
+        for i in range(n - 1):
+            last = combos[:, -1]
+            counts = len(cards) - 1 - last
+            total = counts.sum()
+            starts = np.cumsum(counts) - counts
+            following = np.arange(total) - np.repeat(starts - last - 1, counts)
+            combos = np.column_stack((np.repeat(combos, counts, axis=0), following))
+
+        return cards[combos]
@@ -1,9 +1,10 @@
 print("hello")
 
 import itertools
+import numpy as np
 from .card import Card
 from .deck import Deck
-from .lookup import LookupTable
+from .lookup import LookupTable, get_lookup_table
 
 class Evaluator(object):
     """
@@ -14,11 +15,19 @@ class Evaluator(object):
     in fact the lookup table generation can be done in under a second and 
     consequent evaluations are very fast. Won't beat C, but very fast as 
     all calculations are done with bit arithmetic and table lookups. 
+
+    Evaluators share the process wide lookup table unless given their own, 
+    so creating one is cheap; get_evaluator() returns a shared instance.
     """
 
-    def __init__(self):
+    # adding 3 to each nibble of a _suit_histograms() value sets the nibble's
+    # top bit exactly when that suit has 5 or more cards
+    FLUSH_BIAS = 0x3333
+    FLUSH_TEST = 0x8888
+
+    def __init__(self, table=None):
 
-        self.table = LookupTable()
+        self.table = table if table is not None else get_lookup_table()
         
         self.hand_size_map = {
             5 : self._five,
@@ -36,6 +45,118 @@ class Evaluator(object):
         all_cards = cards + board
         return self.hand_size_map[len(all_cards)](all_cards)
 
+    def evaluate_batch(self, hands):
+        """
+        Vectorized evaluate() for many hands at once. 
+
+        Takes an (N, k) array of cards in integer form, k = 5, 6 or 7 (hole 
+        cards and board together, in any order), and returns the N ranks as 
+        an int32 array. Does the same flush / prime product lookups as _five 
+        and _best, just as whole-array operations on the table arrays.
+        """
+        hands = np.asarray(hands, dtype=np.int64)
+        if hands.ndim != 2 or hands.shape[1] not in self.hand_size_map:
+            raise ValueError("Expected an (N, 5), (N, 6) or (N, 7) array of cards, got shape %s" 
+                % (hands.shape,))
+
+        # non flush: binary search the sorted prime products
+        product = np.prod(hands & 0xFF, axis=1, dtype=np.uint64)
+        index = np.searchsorted(self.table.unsuited_keys, product)
+        ranks = self.table.unsuited_ranks[index].astype(np.int32)
+
+        # flush: at most one suit can have 5 or more cards
+        suits = Evaluator._suit_histograms(hands)
+        flush = ((suits + Evaluator.FLUSH_BIAS) & Evaluator.FLUSH_TEST) != 0
+        if flush.any():
+            ranks[flush] = self._flush_batch(hands[flush], suits[flush])
+
+        return ranks
+
+    @staticmethod
+    def _suit_histograms(cards):
+        """
+        Suit histogram of each row of an array of cards, with one nibble per
+        suit: the suit bits 1, 2, 4, 8 raised to the 4th power are 1, 16, 256
+        and 4096, so summing them counts each suit in its own nibble.
+        """
+        suits = (cards >> 12) & 0xF
+        suits *= suits
+        suits *= suits
+        return suits.sum(axis=1)
+
+    def _flush_batch(self, hands, suits):
+        """
+        Ranks of an array of hands that all flush, given their suit histograms.
+        """
+        flush_suit = np.zeros(len(hands), dtype=hands.dtype)
+        for i in range(4):
+            flush_suit[((suits >> (4 * i)) & 0xF) >= 5] = 1 << i << 12
+
+        in_suit = (hands & flush_suit[:, None]) != 0
+        bits = np.bitwise_or.reduce(np.where(in_suit, (hands >> 16) & 0x1FFF, 0), axis=1)
+        return self.table.flush_best_array[bits]
+
+    def evaluate_boards(self, boards, hands):
+        """
+        Scores each hand of hole cards on every board of an (N, m) array of 
+        boards, returning a (len(hands), N) array of ranks. 
+
+        Same results as evaluate_batch on each hand + board, but the board 
+        side is done once and shared by all the hands: every board's rank 
+        multiset is reduced to an id (at most 6175 distinct ones for 5 
+        card boards), so a hand only scores the distinct multisets with its 
+        own ranks added and gathers those per board. Only boards that flush 
+        with a hand go through the full per hand evaluation.
+
+        A board that shares a card with a hand gets a meaningless rank for
+        that hand rather than an error, so callers can score one board array
+        for several hands and mask out each hand's dead boards afterwards.
+        """
+        boards = np.asarray(boards, dtype=np.int32)
+        results = np.empty((len(hands), len(boards)), dtype=np.int32)
+        if len(boards) == 0:
+            return results
+
+        # board rank multiset => key from its sorted ranks in base 13
+        board_ranks = np.sort(((boards >> 8) & 0xF).astype(np.int8), axis=1)
+        board_keys = np.zeros(len(boards), dtype=np.int32)
+        for column in board_ranks.T:
+            board_keys *= 13
+            board_keys += column
+
+        present = np.zeros(13 ** boards.shape[1], dtype=bool)
+        present[board_keys] = True
+        keys = np.flatnonzero(present)
+
+        # and back from key to the prime product of the multiset
+        key_products = np.ones(len(keys), dtype=np.uint64)
+        remaining = keys.copy()
+        primes = np.array(Card.PRIMES, dtype=np.uint64)
+        for i in range(boards.shape[1]):
+            key_products *= primes[remaining % 13]
+            remaining //= 13
+
+        board_suits = Evaluator._suit_histograms(boards)
+        key_ranks = np.zeros(len(present), dtype=np.int32)
+
+        for i, hand in enumerate(hands):
+            product = key_products * np.uint64(Card.prime_product_from_hand(hand))
+            index = np.searchsorted(self.table.unsuited_keys, product)
+            np.minimum(index, len(self.table.unsuited_keys) - 1, out=index)
+            key_ranks[keys] = self.table.unsuited_ranks[index]
+            results[i] = key_ranks[board_keys]
+
+            hand_suits = Evaluator._suit_histograms(np.array([hand]))[0]
+            suits = board_suits + hand_suits
+            flush = ((suits + Evaluator.FLUSH_BIAS) & Evaluator.FLUSH_TEST) != 0
+            if flush.any():
+                flush_boards = boards[flush]
+                flush_hands = np.column_stack((flush_boards, 
+                    np.broadcast_to(np.array(hand, dtype=np.int32), (len(flush_boards), len(hand)))))
+                results[i, flush] = self._flush_batch(flush_hands, suits[flush])
+
+        return results
+
     def _five(self, cards):
         """
         Performs an evalution given cards in integer form, mapping them to
@@ -58,37 +179,42 @@ class Evaluator(object):
         
     def _six(self, cards):
         """
-        Performs five_card_eval() on all (6 choose 5) = 6 subsets
-        of 5 cards in the set of 6 to determine the best ranking, 
-        and returns this ranking.
+        Evaluates a 6 card hand directly, without going through its 
+        (6 choose 5) = 6 subsets of 5 cards. See _best.
         """
-        minimum = LookupTable.MAX_HIGH_CARD
-
-        all5cardcombobs = itertools.combinations(cards, 5)
-        for combo in all5cardcombobs:
-
-            score = self._five(combo)
-            if score < minimum:
-                minimum = score
-
-        return minimum
+        return self._best(cards)
 
     def _seven(self, cards):
         """
-        Performs five_card_eval() on all (7 choose 5) = 21 subsets
-        of 5 cards in the set of 7 to determine the best ranking, 
-        and returns this ranking.
+        Evaluates a 7 card hand directly, without going through its 
+        (7 choose 5) = 21 subsets of 5 cards. See _best.
         """
-        minimum = LookupTable.MAX_HIGH_CARD
+        return self._best(cards)
 
-        all5cardcombobs = itertools.combinations(cards, 5)
-        for combo in all5cardcombobs:
-            
-            score = self._five(combo)
-            if score < minimum:
-                minimum = score
+    def _best(self, cards):
+        """
+        Looks up the best 5 card rank of a 6 or 7 card hand. 
 
-        return minimum
+        With 6 or 7 cards at most one suit can hold 5 or more of them, and 
+        when one does the flush beats anything the other cards can make, so:
+        - a flush is looked up on the rankbits of the flush suit
+        - anything else is looked up on the prime product of all the cards
+        """
+        suits = 0
+        product = 1
+        for c in cards:
+            suits += 1 << ((c >> 10) & 0x3C)  # 4 * suit bit
+            product *= c & 0xFF
+
+        flush_suit = self.table.flush_suit_lookup.get(suits)
+        if flush_suit:
+            handOR = 0
+            for c in cards:
+                if c & flush_suit:
+                    handOR |= c
+            return self.table.flush_best_lookup[handOR >> 16]
+
+        return self.table.unsuited_best_lookup[product]
     
     def get_best_hand(self, cards, board):
         """
@@ -195,4 +321,13 @@ class Evaluator(object):
                         self.class_to_string(self.get_rank_class(self.evaluate(hands[winners[0]], board)))))
 
 
+_shared_evaluator = None
 
+def get_evaluator():
+    """
+    Returns the process wide Evaluator, built on the shared lookup table.
+    """
+    global _shared_evaluator
+    if _shared_evaluator is None:
+        _shared_evaluator = Evaluator()
+    return _shared_evaluator
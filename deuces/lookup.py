@@ -1,4 +1,8 @@
 import itertools
+import os
+import struct
+import threading
+import numpy as np
 from .card import Card
 
 class LookupTable(object):
@@ -23,6 +27,15 @@ class LookupTable(object):
     Examples:
     * Royal flush (best hand possible)          => 1
     * 7-5-4-3-2 unsuited (worst hand possible)  => 7462
+
+    On top of the 5 card tables we keep "best hand" tables so that a 6 or 7 
+    card hand is a single lookup instead of 6 or 21:
+        flush suit's rankbits (5 to 7 bits set)     => best flush rank
+        5, 6 or 7 card hand's unique prime product  => best non flush rank
+
+    Calculating all of this takes a few tenths of a second, so the tables are 
+    written to a versioned binary file the first time and memory mapped after
+    that (see write_tables_to_file for the layout). 
     """
     MAX_STRAIGHT_FLUSH  = 10
     MAX_FOUR_OF_A_KIND  = 166
@@ -58,10 +71,49 @@ class LookupTable(object):
         9 : "High Card"
     }
 
-    def __init__(self):
+    # bump whenever the layout or contents of the table file change
+    TABLE_VERSION = 1
+    TABLE_MAGIC = b'DEUCESLT'
+    TABLE_HEADER = struct.Struct('<8sIII12x')  # padded so the arrays stay aligned
+    TABLE_FILE = 'lookup_v%d.bin' % TABLE_VERSION
+
+    # how many times this process calculated / read the tables
+    builds = 0
+    reads = 0
+
+    def __init__(self, filepath=None):
+        """
+        Reads the lookup tables from the table file, calculating them (and
+        writing the file for next time) if there isn't an up to date one.
+        """
+        self.flush_suit_lookup = {}
+        self.suits()
+
+        if filepath is None:
+            filepath = LookupTable.default_table_path()
+
+        if not self.read_tables_from_file(filepath):
+            self.calculate()
+            try:
+                self.write_tables_to_file(filepath)
+            except OSError:
+                # read only install, keep the tables in memory only
+                pass
+
+    @staticmethod
+    def default_table_path():
+        """
+        $DEUCES_TABLE_PATH if set, otherwise deuces/tables/ next to this file.
+        """
+        return os.environ.get('DEUCES_TABLE_PATH') or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'tables', LookupTable.TABLE_FILE)
+
+    def calculate(self):
         """
         Calculates lookup tables
         """
+        LookupTable.builds += 1
+
         # create dictionaries
         self.flush_lookup = {}
         self.unsuited_lookup = {}
@@ -71,6 +123,19 @@ class LookupTable(object):
                         # we reuse some of the bit sequences
         self.multiples()
 
+        # and the best hand tables on top of the 5 card ones
+        self.flush_best_lookup = [0] * (1 << len(Card.INT_RANKS))
+        self.unsuited_best_lookup = {}
+        self.best_flushes()
+        self.best_unsuited()
+
+        # array copies of the best hand tables, which is what goes to disk
+        keys = sorted(self.unsuited_best_lookup)
+        self.unsuited_keys = np.array(keys, dtype=np.uint64)
+        self.unsuited_ranks = np.array(
+            [self.unsuited_best_lookup[k] for k in keys], dtype=np.uint16)
+        self.flush_best_array = np.array(self.flush_best_lookup, dtype=np.uint16)
+
     def flushes(self):
         """
         Straight flushes and flushes. 
@@ -247,14 +312,164 @@ class LookupTable(object):
                 self.unsuited_lookup[product] = rank
                 rank += 1
 
+    def suits(self):
+        """
+        Suit histograms of hands with up to 7 cards. 
+
+        A hand's suit histogram is hashed by adding 1 << (4 * suit) for every
+        card (see Evaluator._best), which keeps each suit's count in its own 
+        nibble. Only histograms with a suit holding 5 or more cards are stored, 
+        mapped to that suit's bit in card integer form (cdhs << 12).
+        """
+        suit_ints = sorted(Card.CHAR_SUIT_TO_INT_SUIT.values())
+        
+        for counts in itertools.product(range(8), repeat=len(suit_ints)):
+            if sum(counts) > 7:
+                continue
+
+            suit_hash = 0
+            for suit, count in zip(suit_ints, counts):
+                suit_hash += count << (4 * suit)
+
+            for suit, count in zip(suit_ints, counts):
+                if count >= 5:
+                    self.flush_suit_lookup[suit_hash] = suit << 12
+
+    def best_flushes(self):
+        """
+        Best flush for every 5, 6 and 7 card set of one suit. 
+
+        Lookup is done directly on the 13 bit rankbits of the flush suit, 
+        and each set is the best of the sets one card smaller than it. 
+        """
+        for size in (5, 6, 7):
+            for bits in range(len(self.flush_best_lookup)):
+                if bin(bits).count('1') != size:
+                    continue
+
+                if size == 5:
+                    prime_product = Card.prime_product_from_rankbits(bits)
+                    self.flush_best_lookup[bits] = self.flush_lookup[prime_product]
+                    continue
+
+                best = LookupTable.MAX_HIGH_CARD
+                for i in Card.INT_RANKS:
+                    if bits & (1 << i):
+                        score = self.flush_best_lookup[bits ^ (1 << i)]
+                        if score < best:
+                            best = score
+
+                self.flush_best_lookup[bits] = best
+
+    def best_unsuited(self):
+        """
+        Best non flush hand for every 5, 6 and 7 card rank multiset, keyed on
+        the prime product of the cards like the 5 card unsuited table. Prime
+        products are unique per multiset, so all sizes share one table. 
+
+        Built up a card at a time: every 5 card product times every rank
+        that still has a card left gives the 6 card products, and those 
+        give the 7 card ones, keeping the best score seen for each.
+        """
+        self.unsuited_best_lookup.update(self.unsuited_lookup)
+
+        smaller = self.unsuited_lookup
+        for size in (6, 7):
+            bigger = {}
+            for product, score in smaller.items():
+                for prime in Card.PRIMES:
+                    # only 4 cards of each rank
+                    if product % (prime ** 4) == 0:
+                        continue
+
+                    key = product * prime
+                    if score < bigger.get(key, LookupTable.MAX_HIGH_CARD + 1):
+                        bigger[key] = score
+
+            self.unsuited_best_lookup.update(bigger)
+            smaller = bigger
+
     def write_table_to_disk(self, table, filepath):
         """
         Writes lookup table to disk
         """
         with open(filepath, 'w') as f:
-            for prime_prod, rank in table.iteritems():
+            for prime_prod, rank in table.items():
                 f.write(str(prime_prod) +","+ str(rank) + '\n')
 
+    def write_tables_to_file(self, filepath):
+        """
+        Writes the best hand tables to a binary table file:
+
+            header          magic, version, flush and unsuited table sizes
+            uint64[n]       sorted 5, 6 and 7 card prime products
+            uint16[n]       best non flush rank for each prime product
+            uint16[8192]    best flush rank for each flush suit rankbits
+
+        all little endian. The file is written next to its final path and then
+        renamed over it, so concurrent readers never see half a table.
+        """
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+        with open(tmp_filepath, 'wb') as f:
+            f.write(LookupTable.TABLE_HEADER.pack(LookupTable.TABLE_MAGIC, 
+                LookupTable.TABLE_VERSION, len(self.flush_best_array), len(self.unsuited_keys)))
+            f.write(self.unsuited_keys.astype('<u8').tobytes())
+            f.write(self.unsuited_ranks.astype('<u2').tobytes())
+            f.write(self.flush_best_array.astype('<u2').tobytes())
+        os.replace(tmp_filepath, filepath)
+
+    def read_tables_from_file(self, filepath):
+        """
+        Memory maps a table file written by write_tables_to_file and sets up 
+        the lookup tables from it. Returns False if the file is missing or
+        from another table version.
+
+        The arrays stay memory mapped, so every process reading the same file 
+        shares one copy of them in the page cache. The dicts the evaluator 
+        uses are rebuilt from them, which takes a few milliseconds.
+        """
+        try:
+            data = np.memmap(filepath, dtype=np.uint8, mode='r')
+        except (OSError, ValueError):
+            # missing or empty file
+            return False
+
+        header = LookupTable.TABLE_HEADER
+        if len(data) < header.size:
+            return False
+
+        magic, version, n_flush, n_unsuited = header.unpack(bytes(data[:header.size]))
+        if magic != LookupTable.TABLE_MAGIC or version != LookupTable.TABLE_VERSION:
+            return False
+        if len(data) != header.size + 10 * n_unsuited + 2 * n_flush:
+            return False
+
+        offset = header.size
+        self.unsuited_keys = data[offset:offset + 8 * n_unsuited].view('<u8')
+        offset += 8 * n_unsuited
+        self.unsuited_ranks = data[offset:offset + 2 * n_unsuited].view('<u2')
+        offset += 2 * n_unsuited
+        self.flush_best_array = data[offset:offset + 2 * n_flush].view('<u2')
+
+        self.flush_best_lookup = self.flush_best_array.tolist()
+        self.unsuited_best_lookup = dict(zip(
+            self.unsuited_keys.tolist(), self.unsuited_ranks.tolist()))
+
+        # the 5 card tables are a subset of the best hand ones
+        self.unsuited_lookup = self.unsuited_best_lookup
+        self.flush_lookup = {}
+        for bits in range(n_flush):
+            if bin(bits).count('1') == 5:
+                prime_product = Card.prime_product_from_rankbits(bits)
+                self.flush_lookup[prime_product] = self.flush_best_lookup[bits]
+
+        LookupTable.reads += 1
+        return True
+
     def get_lexographically_next_bit_sequence(self, bits):
         """
         Bit hack from here:
@@ -270,3 +485,30 @@ class LookupTable(object):
             t = (next | (next - 1)) + 1 
             next = t | ((((t & -t) // (next & -next)) >> 1) - 1)
             yield next
+
+
+_shared_table = None
+_shared_table_lock = threading.Lock()
+
+def get_lookup_table():
+    """
+    Returns the process wide LookupTable, reading (or building) it on first
+    use. It is only ever read from, so threads share it as is, and a process
+    forked after the first call inherits it copy-on-write instead of 
+    loading its own. LookupTable.builds / .reads count the actual work done.
+    """
+    global _shared_table
+    if _shared_table is None:
+        with _shared_table_lock:
+            if _shared_table is None:
+                _shared_table = LookupTable()
+    return _shared_table
+
+def _reset_lock_after_fork():
+    # a fork from another thread while it held the lock would leave the 
+    # child's copy locked forever
+    global _shared_table_lock
+    _shared_table_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_lock_after_fork)
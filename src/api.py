@@ -0,0 +1,304 @@
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import sys
+from collections import defaultdict
+from typing import Annotated, List, Literal, Optional, Union
+
+import numpy as np
+from fastapi import FastAPI
+from pydantic import BaseModel, Field, model_validator
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from deuces.card import Card
+from deuces.evaluator import get_evaluator
+from odds import mc_odds, odds_result
+from percentage_rank import percentage_rank
+from runner import get_pool
+from session import hse_1, HandPotentials_1, HandPotentials_2
+import spot_cache
+
+# JSON API for the analytics, for scripts that query many spots without the
+# Streamlit app:
+#
+#     uvicorn api:app --app-dir src          (python src/api.py does the same)
+#
+# Every query goes through the app's result cache and store (see
+# spot_cache), so the API and the app share results. The rest are worked
+# out on the process wide worker pool (see runner.get_pool), whose workers
+# each load the evaluator on the shared lookup table once: HSE and hand
+# potentials one job per flop, so the flop's StreetSession is built once for
+# all of its queries, and Monte Carlo odds one job per block. Queries sent
+# one at a time are gathered into batches too (see _Batcher).
+
+# worker processes, API_WORKERS overrides it (one per core by default)
+WORKERS = int(os.environ['API_WORKERS']) if 'API_WORKERS' in os.environ else None
+# Monte Carlo odds are dealt ODDS_BLOCK trials per job
+ODDS_BLOCK = 10000
+
+RANKS = '23456789TJQKA'
+SUITS = 'shdc'
+
+def _check_cards(*card_sets):
+    cards = [card for cards in card_sets for card in cards]
+    for card in cards:
+        if len(card) != 2 or card[0] not in RANKS or card[1] not in SUITS:
+            raise ValueError(f"not a card: {card!r} (e.g. 'Ah', 'Tc')")
+    if len(cards) != len(set(cards)):
+        raise ValueError("the same card is dealt twice")
+
+def _cards(cards):
+    return [Card.new(card) for card in cards]
+
+Hand = Annotated[List[str], Field(min_length=2, max_length=2)]
+
+class HSEQuery(BaseModel):
+    """
+    hse_1(board, hand) on the flop, turn or river.
+    """
+    kind: Literal['hse'] = 'hse'
+    board: List[str] = Field(min_length=3, max_length=5)
+    hand: Hand
+
+    @model_validator(mode='after')
+    def _valid(self):
+        _check_cards(self.board, self.hand)
+        return self
+
+class PotentialsQuery(BaseModel):
+    """
+    HandPotentials_1(board, hands) (lookahead 1, on the flop or turn) or
+    HandPotentials_2(board, hands) (lookahead 2, on the flop).
+    """
+    kind: Literal['potentials'] = 'potentials'
+    board: List[str] = Field(min_length=3, max_length=4)
+    hands: List[Hand] = Field(min_length=1)
+    lookahead: Literal[1, 2] = 2
+
+    @model_validator(mode='after')
+    def _valid(self):
+        _check_cards(self.board, *self.hands)
+        if len(self.board) - 3 + self.lookahead > 2:
+            raise ValueError("only %d cards left to come" % (5 - len(self.board)))
+        return self
+
+class OddsQuery(BaseModel):
+    """
+    Monte Carlo heads up odds of hero against villain, mc_odds's result (the
+    counts mc_odds_calculator's win percentages come from, with the standard
+    error and 95% confidence interval of the equity). With a seed the result
+    is reproducible, and cached.
+    """
+    kind: Literal['odds'] = 'odds'
+    hero: Hand
+    villain: Hand
+    board: List[str] = Field(default=[], max_length=4)
+    trials: int = Field(default=100000, ge=1, le=10000000)
+    seed: Optional[int] = Field(default=None, ge=0)
+
+    @model_validator(mode='after')
+    def _valid(self):
+        _check_cards(self.hero, self.villain, self.board)
+        return self
+
+class RankQuery(BaseModel):
+    """
+    percentage_rank(board, hand).
+    """
+    kind: Literal['rank'] = 'rank'
+    board: List[str] = Field(min_length=3, max_length=5)
+    hand: Hand
+
+    @model_validator(mode='after')
+    def _valid(self):
+        _check_cards(self.board, self.hand)
+        return self
+
+Query = Annotated[Union[HSEQuery, PotentialsQuery, OddsQuery, RankQuery], Field(discriminator='kind')]
+
+class Batch(BaseModel):
+    queries: List[Query] = Field(max_length=10000)
+
+# the cached versions of the functions, under the same keys as the app's.
+# Seeded odds are keyed by the exact cards: suit isomorphic spots deal
+# different boards from the same seed
+_cached = {function: spot_cache.results.cached(function)
+    for function in (hse_1, HandPotentials_1, HandPotentials_2)}
+_cached[mc_odds] = spot_cache.results.cached(mc_odds, exact=True)
+
+def _call(query):
+    """
+    The function a query runs and its arguments.
+    """
+    if query.kind == 'hse':
+        return hse_1, (_cards(query.board), _cards(query.hand)), {}
+    if query.kind == 'potentials':
+        function = HandPotentials_1 if query.lookahead == 1 else HandPotentials_2
+        return function, (_cards(query.board), [_cards(hand) for hand in query.hands]), {}
+    if query.kind == 'odds':
+        return mc_odds, (_cards(query.hero), _cards(query.villain), _cards(query.board)), \
+            {"trials": query.trials, "seed": query.seed}
+    return percentage_rank, (_cards(query.board), _cards(query.hand)), {}
+
+def _response(query, result):
+    """
+    A query's result as JSON.
+    """
+    if query.kind == 'potentials':
+        return [{"ppot": float(ppot), "npot": float(npot), "hp_total": [int(n) for n in hp_total]}
+            for ppot, npot, hp_total in result]
+    if query.kind == 'rank':
+        return {"percentage": float(result)}
+    return result
+
+def _flop_job(calls):
+    """
+    Runs the HSE and hand potential calls of one flop one after the other
+    in a worker, so they share its StreetSession of the flop. What they
+    print is dropped.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return [function(*args, **kwargs) for function, args, kwargs in calls]
+
+async def _odds(args, trials, seed):
+    """
+    mc_odds(*args, trials=trials, seed=seed, block=ODDS_BLOCK), one job per
+    block (see runner.run_odds).
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool(WORKERS)
+    root = np.random.SeedSequence(seed)
+    blocks = -(-trials // ODDS_BLOCK)
+    parts = await asyncio.gather(*(loop.run_in_executor(pool, functools.partial(mc_odds, *args,
+        trials=trials, seed=root, block=ODDS_BLOCK, part=(i, blocks))) for i in range(blocks)))
+    return odds_result(sum(p["wins"] for p in parts), sum(p["ties"] for p in parts),
+        sum(p["losses"] for p in parts))
+
+async def _run_batch(queries):
+    """
+    The results of queries, in order. Cached results are used as they are
+    and ranks (one evaluation) are worked out here, the rest at once on the
+    worker pool.
+    """
+    loop = asyncio.get_running_loop()
+    calls = [_call(query) for query in queries]
+    results = [None] * len(queries)
+    flops = defaultdict(list)
+    odds = []
+
+    for i, (function, args, kwargs) in enumerate(calls):
+        if function is percentage_rank:
+            results[i] = percentage_rank(*args)
+            continue
+        if function is not mc_odds or kwargs["seed"] is not None:
+            results[i] = _cached[function].lookup(*args, **kwargs)
+            if results[i] is not None:
+                continue
+        if function is mc_odds:
+            odds.append(i)
+        else:
+            flops[tuple(sorted(args[0][:3]))].append(i)
+
+    async def run_flop(indices):
+        flop_results = await loop.run_in_executor(get_pool(WORKERS), _flop_job, [calls[i] for i in indices])
+        for i, result in zip(indices, flop_results):
+            function, args, kwargs = calls[i]
+            _cached[function].put(result, *args, **kwargs)
+            results[i] = result
+
+    async def run_odds(i):
+        function, args, kwargs = calls[i]
+        results[i] = await _odds(args, **kwargs)
+        if kwargs["seed"] is not None:
+            _cached[function].put(results[i], *args, **kwargs)
+
+    await asyncio.gather(*(run_flop(indices) for indices in flops.values()), *(run_odds(i) for i in odds))
+    return [_response(query, result) for query, result in zip(queries, results)]
+
+class _Batcher:
+    """
+    Gathers the queries sent one at a time into batches for _run_batch:
+    a batch is run once it has max_size queries or window seconds after its
+    first one came in, so queries of the same flop sent close together
+    share a job.
+    """
+
+    def __init__(self, window=0.005, max_size=512):
+        self.window = window
+        self.max_size = max_size
+        self.pending = []
+        self.timer = None
+
+    async def run(self, query):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((query, future))
+        if len(self.pending) >= self.max_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        task = asyncio.ensure_future(_run_batch([query for query, _ in batch]))
+        task.add_done_callback(functools.partial(self._done, [future for _, future in batch]))
+
+    @staticmethod
+    def _done(futures, task):
+        for i, future in enumerate(futures):
+            if future.done():
+                continue
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result()[i])
+
+_batcher = _Batcher()
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # load the evaluator here and start the workers (each loading it too)
+    # before the first query comes in
+    get_evaluator()
+    await asyncio.get_running_loop().run_in_executor(get_pool(WORKERS), abs, 0)
+    yield
+
+app = FastAPI(title="Poker Analytics API", lifespan=lifespan)
+
+@app.post("/hse")
+async def hse(query: HSEQuery):
+    return await _batcher.run(query)
+
+@app.post("/potentials")
+async def potentials(query: PotentialsQuery):
+    return await _batcher.run(query)
+
+@app.post("/odds")
+async def odds(query: OddsQuery):
+    return await _batcher.run(query)
+
+@app.post("/rank")
+async def rank(query: RankQuery):
+    return await _batcher.run(query)
+
+@app.post("/batch")
+async def batch(batch: Batch):
+    """
+    Results of up to 10000 queries of any kind, in order.
+    """
+    return {"results": await _run_batch(batch.queries)}
+
+@app.get("/stats")
+async def stats():
+    return {"cache": spot_cache.results.stats(), "store": spot_cache.results.store.stats()}
+
+if __name__ == '__main__':
+    import uvicorn
+    # uvicorn uses httptools to parse requests when it's installed
+    uvicorn.run(app, host=os.environ.get('HOST', '127.0.0.1'), port=int(os.environ.get('PORT', 8000)))
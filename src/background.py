@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from session import StreetSession, has_session, keep_session, hse_1, HandPotentials_1, HandPotentials_2
+import spot_cache
+
+# Works out a spot's HSE and hand potentials off the Streamlit script
+# thread, so the page doesn't wait for the flop's enumeration (see
+# session.StreetSession): the page shows the cards and the quick results
+# straight away and polls the job for running estimates until the exact
+# results are in. One thread, since the scoring keeps a core busy; a
+# cancelled job gives it up at its next chunk.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis')
+
+# the cached versions of the functions, under the same keys as the app's
+_cached = {function.__name__: spot_cache.results.cached(function)
+    for function in (hse_1, HandPotentials_1, HandPotentials_2)}
+
+class AnalysisJob:
+    """
+    Builds the StreetSession of board's flop on the background thread,
+    scoring hands' own ranks first and then the opponent hands in random
+    chunks. After each chunk partial holds the running estimate from the
+    opponent hands scored so far:
+
+        {"scored": fraction of opponent hands scored,
+         "hse": [hse_1(board, hand) for hand in hands],
+         "potentials": HandPotentials_<lookahead>(board, hands), or None
+                       if lookahead is 0 or there's no estimate of them
+                       yet}
+
+    which is exact once scored is 1. Then the exact results are put in the
+    app's result cache (see spot_cache.results), so the page finds them
+    even if the session has been evicted by then, and the session is kept
+    (see session.keep_session), so the other results of board are quick.
+    """
+
+    def __init__(self, board, hands, lookahead, chunks=16):
+        self.board = list(board)
+        self.hands = [list(hand) for hand in hands]
+        self.lookahead = lookahead
+        self.chunks = chunks
+        self.partial = None
+        self.cancelled = threading.Event()
+        self.future = _executor.submit(self._run)
+
+    def _run(self):
+        if has_session(self.board):
+            return True
+        session = StreetSession(self.board[:3], build=False)
+        for scored in session.build(first=self.hands, chunks=self.chunks):
+            if self.cancelled.is_set():
+                return False
+            self.partial = self._estimate(session, scored)
+        for hand, hse in zip(self.hands, self.partial["hse"]):
+            _cached['hse_1'].put(hse, self.board, hand)
+        if self.lookahead:
+            _cached['HandPotentials_%d' % self.lookahead].put(self.partial["potentials"], self.board, self.hands)
+        keep_session(session)
+        return True
+
+    def _estimate(self, session, scored):
+        try:
+            if self.lookahead == 2:
+                potentials = session.HandPotentials_2(self.board, self.hands)
+            elif self.lookahead == 1:
+                potentials = session.HandPotentials_1(self.board, self.hands)
+            else:
+                potentials = None
+        except ZeroDivisionError:
+            # the opponent hands scored so far are all ahead of (or all
+            # behind) a hand, so its potentials have nothing to go on yet
+            if scored == 1:
+                raise
+            potentials = None
+        return {
+            "scored": scored,
+            "hse": [session.hse_1(self.board, hand) for hand in self.hands],
+            "potentials": potentials
+        }
+
+    def is_for(self, board, hands, lookahead):
+        return (self.board == list(board) and self.hands == [list(hand) for hand in hands]
+            and self.lookahead == lookahead)
+
+    def cancel(self):
+        """
+        Drops the job if it hasn't started, else stops it after its current
+        chunk.
+        """
+        self.cancelled.set()
+        self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def error(self):
+        """
+        The exception the job failed with, or None.
+        """
+        if self.future.cancelled():
+            return None
+        return self.future.exception()
@@ -0,0 +1,94 @@
+import itertools
+import numpy as np
+from deuces.card import Card
+
+# Suits are indexed by their bit in the card int: s = 0, h = 1, d = 2, c = 3,
+# and a permutation perm relabels suit i as suit perm[i]. Relabelling suits
+# never changes a hand's rank, so any enumeration only has to visit one
+# member of each class of suit isomorphic combinations, weighted by the
+# size of the class.
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+
+# suit bits (1, 2, 4, 8) => suit index
+SUIT_INDEX = np.array([0, 0, 1, 0, 2, 0, 0, 0, 3, 0, 0, 0, 0, 0, 0, 0])
+
+def permute_suits(cards, perm):
+    """
+    Relabels the suits of a list of cards with perm.
+    """
+    permuted = []
+    for c in cards:
+        suit = Card.get_suit_int(c).bit_length() - 1
+        permuted.append((c & ~0xF000) | (1 << perm[suit] << 12))
+    return permuted
+
+def suit_stabilizer(*card_sets, group=SUIT_PERMUTATIONS):
+    """
+    The permutations in group that map each of the card sets onto itself,
+    e.g. suit_stabilizer(board, hand) are the relabellings that leave a spot
+    unchanged. Always contains the identity.
+    """
+    stabilizer = []
+    for perm in group:
+        if all(set(permute_suits(cards, perm)) == set(cards) for cards in card_sets):
+            stabilizer.append(perm)
+    return stabilizer
+
+def card_masks(combos):
+    """
+    Turns an (N, k) array of cards into N 52 bit masks, with card
+    13 * suit index + rank set, so suit i's ranks are bits 13i to 13i + 12.
+    """
+    combos = np.asarray(combos, dtype=np.int64)
+    bits = 13 * SUIT_INDEX[(combos >> 12) & 0xF] + ((combos >> 8) & 0xF)
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), bits.astype(np.uint64)), axis=1)
+
+def permute_masks(masks, perm):
+    """
+    Relabels the suits of an array of card_masks() with perm.
+    """
+    permuted = np.zeros_like(masks)
+    for suit in range(4):
+        ranks = (masks >> np.uint64(13 * suit)) & np.uint64(0x1FFF)
+        permuted |= ranks << np.uint64(13 * perm[suit])
+    return permuted
+
+def orbits(combos, group):
+    """
+    Splits an (N, k) array of card combinations into its classes of suit
+    isomorphic combinations under the permutations in group (which has to
+    be a group, e.g. a suit_stabilizer).
+
+    Returns one member of each class, the one with the smallest card mask,
+    and the size of each class, so summing a suit invariant result over the
+    members times their weights equals summing it over all the combos.
+    """
+    combos = np.asarray(combos)
+    if len(group) <= 1 or len(combos) == 0:
+        return combos, np.ones(len(combos), dtype=np.int64)
+
+    masks = card_masks(combos)
+    smallest = np.ones(len(combos), dtype=bool)
+    fixed = np.zeros(len(combos), dtype=np.int64)
+    for perm in group:
+        image = permute_masks(masks, perm)
+        smallest &= masks <= image
+        fixed += image == masks
+
+    # class size = |group| / number of permutations that fix the combo
+    return combos[smallest], (len(group) // fixed)[smallest]
+
+def canonicalize(hand, board):
+    """
+    Canonical form of a spot: the suit relabelling of (hand, board) with the
+    smallest sorted card ints, so all suit isomorphic spots share one form.
+    Returns the canonical hand, the canonical board and how many distinct
+    spots share that form.
+    """
+    images = set()
+    for perm in SUIT_PERMUTATIONS:
+        images.add((tuple(sorted(permute_suits(hand, perm))),
+            tuple(sorted(permute_suits(board, perm)))))
+
+    canonical_hand, canonical_board = min(images)
+    return list(canonical_hand), list(canonical_board), len(images)
@@ -1,11 +1,13 @@
-import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import get_evaluator
+from canonical import card_masks, orbits, suit_stabilizer
 
-evaluator = Evaluator()
+evaluator = get_evaluator()
 
-def HandPotential_1(boardcards, ourcards):
+def _opponent_potentials(boardcards, ourcards, opphands, oppweights, group, num_next):
     # Hand potential array, each index represents ahead, tied, and behind.
     HP = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
     # Initialize HPTotal to 0.
@@ -16,15 +18,10 @@ def HandPotential_1(boardcards, ourcards):
     ourrank = evaluator.evaluate(boardcards, ourcards)
 
     # Remove the cards from the deck.
-    # Card.print_pretty_cards(boardcards)
-    # Card.print_pretty_cards(ourcards)
-
     for card in boardcards + ourcards:
         deck.cards.remove(card)
 
-    for oppcards in itertools.combinations(deck.cards, 2):
-
-        oppcards = list(oppcards)
+    for oppcards, oppweight in zip(opphands, oppweights):
 
         # Remove the cards from the deck.
         for card in oppcards:
@@ -37,89 +34,72 @@ def HandPotential_1(boardcards, ourcards):
             index = 1 #tied
         else:
             index = 2 #behind
-        
-        # All possiblities of next card
-        for next_card in deck.cards:
-            HPTotal[index] += 1
-            updated_board = boardcards + [next_card]
+
+        # All possiblities of the next num_next cards
+        oppgroup = suit_stabilizer(oppcards, group=group)
+        runouts, weights = orbits(Deck.GetCombinations(deck.cards, num_next), oppgroup)
+
+        for next_cards, weight in zip(runouts.tolist(), weights.tolist()):
+            weight *= oppweight
+            HPTotal[index] += weight
+            updated_board = boardcards + next_cards
             ourbest = evaluator.evaluate(updated_board, ourcards)
             oppbest = evaluator.evaluate(updated_board, oppcards)
             
             if ourbest < oppbest:
-                HP[index][0] += 1
+                HP[index][0] += weight
             elif ourbest == oppbest:
-                HP[index][1] += 1
+                HP[index][1] += weight
             else:
-                HP[index][2] += 1
+                HP[index][2] += weight
         
         # Restore the cards to the deck.
         for card in oppcards:
             deck.cards.append(card)
 
-    print("HP: ", HP)
-    print("HPTotal: ", HPTotal)
-
-    # if the last two row of HP is all 0, then Ppot = 0
-    if HP[2][0] == 0 and HP[2][1] == 0 and HP[2][2] == 0 and HP[1][0] == 0 and HP[1][1] == 0 and HP[1][2] == 0:
-        Ppot = 0
-    else:
-        Ppot = (HP[2][0] + HP[2][1]/2 + HP[1][0]/2) / (HPTotal[2] + HPTotal[1])
-    
-    Npot = (HP[0][2] + HP[1][2]/2 + HP[0][1]/2) / (HPTotal[0] + HPTotal[1])
-    print("Ppot: ", Ppot)
-    print("Npot: ", Npot)
-
-    return Ppot, Npot, HPTotal
+    return HP, HPTotal
 
+def _hand_potential(boardcards, ourcards, num_next, workers=1):
+    """
+    HP and HPTotal over every opponent hand and every num_next card runout.
 
-def HandPotential_2(boardcards, ourcards):
-    # Hand potential array, each index represents ahead, tied, and behind.
-    HP = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
-    # Initialize HPTotal to 0.
-    HPTotal = [0, 0, 0]
-
+    With workers > 1 the opponent hands are dealt round robin to that many
+    processes, which each work through their share and send back their HP
+    and HPTotal to be summed. Only cards and weights go to the workers: each
+    one gets its evaluator from get_evaluator(), which maps the lookup table
+    file rather than receiving the table. The counts are integers, so the
+    result is the same as the serial one.
+    """
     deck = Deck()
-
-    ourrank = evaluator.evaluate(boardcards, ourcards)
-
-    # Remove the cards from the deck.
     for card in boardcards + ourcards:
         deck.cards.remove(card)
 
-    for oppcards in itertools.combinations(deck.cards, 2):
-        oppcards = list(oppcards)
+    # One opponent hand per class of suit isomorphic hands, weighted by the
+    # size of the class.
+    group = suit_stabilizer(boardcards, ourcards)
+    opphands, oppweights = orbits(Deck.GetCombinations(deck.cards, 2), group)
+    opphands, oppweights = opphands.tolist(), oppweights.tolist()
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_opponent_potentials, boardcards, ourcards,
+                opphands[i::workers], oppweights[i::workers], group, num_next)
+                for i in range(workers)]
+            parts = [future.result() for future in futures]
+    else:
+        parts = [_opponent_potentials(boardcards, ourcards, opphands, oppweights, group, num_next)]
 
-        # Remove the cards from the deck.
-        for card in oppcards:
-            deck.cards.remove(card)
+    HP = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    HPTotal = [0, 0, 0]
+    for part_HP, part_HPTotal in parts:
+        for i in range(3):
+            HPTotal[i] += part_HPTotal[i]
+            for j in range(3):
+                HP[i][j] += part_HP[i][j]
 
-        opprank = evaluator.evaluate(boardcards, oppcards)
-        if ourrank < opprank:
-            index = 0 #ahead
-        elif ourrank == opprank:
-            index = 1 #tied
-        else:
-            index = 2 #behind
+    return HP, HPTotal
 
-        # All possiblities of the next 2 cards (turn and river)
-        for next_cards in itertools.combinations(deck.cards, 2):
-            next_cards = list(next_cards)
-            HPTotal[index] += 1
-            updated_board = boardcards + next_cards
-            ourbest = evaluator.evaluate(updated_board, ourcards)
-            oppbest = evaluator.evaluate(updated_board, oppcards)
-            
-            if ourbest < oppbest:
-                HP[index][0] += 1
-            elif ourbest == oppbest:
-                HP[index][1] += 1
-            else:
-                HP[index][2] += 1
-        
-        # Restore the cards to the deck.
-        for card in oppcards:
-            deck.cards.append(card)
-    
+def _potentials(HP, HPTotal):
     print("HP: ", HP)
     print("HPTotal: ", HPTotal)
 
@@ -133,7 +113,100 @@ def HandPotential_2(boardcards, ourcards):
     print("Ppot: ", Ppot)
     print("Npot: ", Npot)
 
+    return Ppot, Npot
+
+def HandPotential_1(boardcards, ourcards, workers=1):
+    HP, HPTotal = _hand_potential(boardcards, ourcards, 1, workers)
+    Ppot, Npot = _potentials(HP, HPTotal)
+
     return Ppot, Npot, HPTotal
+
+
+def HandPotential_2(boardcards, ourcards, workers=1):
+    # turn and river
+    HP, HPTotal = _hand_potential(boardcards, ourcards, 2, workers)
+    Ppot, Npot = _potentials(HP, HPTotal)
+
+    return Ppot, Npot, HPTotal
+
+def _joint_hand_potential(boardcards, hands, num_next):
+    """
+    HP and HPTotal of each of several hands on the same board, from one
+    shared enumeration.
+
+    Every two card hand left in the deck is scored once on the board and
+    once on each board + num_next card runout (a single evaluate_boards
+    call), and the known hands are among them. Each known hand then only
+    compares its own row against the other rows, counting the opponent
+    hands and runouts that don't share a card with it or with each other,
+    the same ones HandPotential_1/2 go through one by one.
+    """
+    deck = Deck.GetFullDeck()
+    for card in boardcards:
+        deck.remove(card)
+
+    opphands = Deck.GetCombinations(deck, 2)
+    runouts = Deck.GetCombinations(deck, num_next)
+    opp_masks = card_masks(opphands)
+    runout_masks = card_masks(runouts)
+
+    boards = np.column_stack((np.broadcast_to(np.array(boardcards), (len(runouts), len(boardcards))), runouts))
+    ranks = evaluator.evaluate_boards(np.array([boardcards]), opphands.tolist())[:, 0]
+    bests = evaluator.evaluate_boards(boards, opphands.tolist())
+    clash = (opp_masks[:, None] & runout_masks[None, :]) != 0
+
+    results = []
+    for ourcards in hands:
+        ours = int(card_masks([ourcards])[0])
+        ourindex = np.flatnonzero(opp_masks == ours)[0]
+        results.append(_count_potentials(ranks, bests, opp_masks, runout_masks, clash, ourindex, ours))
+
+    return results
+
+def _count_potentials(ranks, bests, opp_masks, runout_masks, clash, ourindex, dead, rows=None):
+    """
+    HP and HPTotal of the hand at ourindex from the ranks of every hand now
+    and their bests after every runout (see _joint_hand_potential), counting
+    the opponent hands and runouts that share no card with dead (a card
+    mask of our cards, plus any cards dealt since the ranks were worked
+    out) or with each other (clash), and only the opponent hands in rows (a
+    boolean mask) if it's given.
+    """
+    # ahead (0), tied (1) or behind (2) now and after each runout
+    now = 1 - np.sign(ranks - ranks[ourindex])
+    later = 1 - np.sign(bests - bests[ourindex])
+
+    opp_live = (opp_masks & dead) == 0
+    if rows is not None:
+        opp_live &= rows
+    live = opp_live[:, None] & ((runout_masks & dead) == 0)[None, :] & ~clash
+    cells = np.bincount((3 * now[:, None] + later)[live], minlength=9)
+
+    HP = cells.reshape(3, 3).tolist()
+    HPTotal = [sum(row) for row in HP]
+    return HP, HPTotal
+
+def HandPotentials_1(boardcards, hands):
+    """
+    HandPotential_1 of each of hands, sharing the enumeration between them.
+    Returns a list of (Ppot, Npot, HPTotal), one per hand.
+    """
+    results = []
+    for HP, HPTotal in _joint_hand_potential(boardcards, hands, 1):
+        Ppot, Npot = _potentials(HP, HPTotal)
+        results.append((Ppot, Npot, HPTotal))
+    return results
+
+def HandPotentials_2(boardcards, hands):
+    """
+    HandPotential_2 of each of hands, sharing the enumeration between them.
+    Returns a list of (Ppot, Npot, HPTotal), one per hand.
+    """
+    results = []
+    for HP, HPTotal in _joint_hand_potential(boardcards, hands, 2):
+        Ppot, Npot = _potentials(HP, HPTotal)
+        results.append((Ppot, Npot, HPTotal))
+    return results
     
 if __name__ == "__main__":
     deck = Deck()
@@ -1,120 +1,281 @@
-import itertools
+import math
+from functools import lru_cache
+import numpy as np
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import get_evaluator
 # from hse.hse_2 import hse_2
 # from hse.hse_1 import hse_1
 
-evaluator = Evaluator()
+evaluator = get_evaluator()
 
-def hse_1(board, hand):
-    wins = 0
-    losses = 0
-    ties = 0
+def _opponent_ranks(board, hand):
+    """
+    Every hand an opponent can hold, as pairs of indices into the live deck,
+    and the rank of each one on board. Everything else is counted from
+    these two arrays, so each opponent hand is only evaluated once.
+    """
+    deck = Deck.GetFullDeck()
+    for card in board + hand:
+        deck.remove(card)
 
-    deck = Deck()
+    opphands = Deck.GetCombinations(np.arange(len(deck)), 2)
+    cards = np.array(deck)[opphands]
+    ranks = evaluator.evaluate_batch(np.column_stack((cards, np.broadcast_to(board, (len(cards), len(board))))))
+    return opphands, ranks, len(deck)
 
-    for card in board + hand: 
-        deck.cards.remove(card)
-    
-    # Make sure there are at least 5 cards (3 from flop + 2 from hand)
-    if len(board) + len(hand) < 5:
-        print("Not enough cards to evaluate a valid hand. Add more cards (turn/river).")
-        return {
-            "wins": wins,
-            "losses": losses,
-            "ties": ties,
-            "hse": None
-        }
+def _disjoint_pairs(opphands, num_cards):
+    """
+    Number of ordered pairs of opponent hands out of opphands that don't
+    share a card. Of the |S|^2 ordered pairs, the ones sharing card c are
+    n_c^2 (n_c hands of S hold c), where a hand paired with itself is
+    counted once for each of its two cards, which leaves
+    |S|^2 - sum(n_c^2) + |S|.
+    """
+    n = np.bincount(opphands.ravel(), minlength=num_cards).astype(np.int64)
+    return len(opphands) ** 2 - int((n * n).sum()) + len(opphands)
 
-    hero_score = evaluator.evaluate(board, hand)
-    hero_class = evaluator.get_rank_class(hero_score)
+def _flush_cards(board, hand):
+    """
+    The live cards (as indices into the live deck, like _opponent_ranks's)
+    of the suit the board has three or more cards of, if it has one: the
+    only cards whose suit changes which hands they make.
+    """
+    deck = [card for card in Deck.GetFullDeck() if card not in board + hand]
+    suits = [Card.get_suit_int(card) for card in board]
+    return [i for i, card in enumerate(deck) if suits.count(Card.get_suit_int(card)) >= 3]
 
-    # for all possible starting hands the opponent could have
-    for i in range(len(deck.cards)):
-        for j in range(i + 1, len(deck.cards)):
-
-            villain_hand = [deck.cards[i], deck.cards[j]]
-            villain_score = evaluator.evaluate(board, villain_hand)
-        
-            if hero_score < villain_score:
-                wins += 1
-            elif hero_score > villain_score:
-                losses += 1
-            else:
-                ties += 1
+def _opponent_deals(num_cards, opponents):
+    # ordered deals of opponents two card hands out of num_cards cards
+    return math.perm(num_cards, 2 * opponents) // 2 ** opponents
 
-    print("Hero best hand:")
-    Card.print_pretty_cards(evaluator.get_best_hand(board, hand))
-    print("Rank: ", hero_score)
-    print("Class: ", evaluator.class_to_string(hero_class))
+def _card_types(adjacent):
+    """
+    Splits the live cards into types of interchangeable cards: cards with
+    the same neighbours in adjacent (the matrix of which two card hands are
+    in the set being counted), apart from each other. Two cards of a type
+    are either always or never a hand together.
+    """
+    types = []
+    for card in range(len(adjacent)):
+        for cards in types:
+            rest = np.ones(len(adjacent), dtype=bool)
+            rest[[card, cards[0]]] = False
+            if (np.array_equal(adjacent[card, rest], adjacent[cards[0], rest])
+                    and (len(cards) == 1 or adjacent[card, cards[0]] == adjacent[cards[0], cards[1]])):
+                cards.append(card)
+                break
+        else:
+            types.append([card])
+    return types
 
-    print("Wins: ", wins)
-    print("Losses: ", losses)
-    print("Ties: ", ties)
+# the most (card counts, hands) states _matchings keeps at once; past it
+# the count is given up on rather than left to run for minutes
+MAX_STATES = 2000000
 
-    hse = (wins + ties / 2) / (wins + losses + ties)
-    print("HSE: ", hse)
-    return {
-        "wins": wins,
-        "losses": losses,
-        "ties": ties,
-        "hse": hse
-    }
+def _twin_classes(nodes, linked, paired):
+    """
+    Groups of two or more types out of nodes that are interchangeable in the
+    graph on nodes: the same neighbours apart from each other, and both
+    paired or both not.
+    """
+    classes = []
+    for a in nodes:
+        for group in classes:
+            b = group[0]
+            if paired[a] == paired[b] and all(linked[a][c] == linked[b][c] for c in nodes if c != a and c != b):
+                group.append(a)
+                break
+        else:
+            classes.append([a])
+    return [group for group in classes if len(group) > 1]
 
-def hse_2(board, hand):
-    wins = 0
-    losses = 0
-    ties = 0
+@lru_cache(maxsize=None)
+def _hands_between(left_a, left_b, x, same):
+    """
+    Ways to make x hands between the left_a cards of one type and the
+    left_b of another, or x hands within a type (same) of left_a cards.
+    """
+    if same:
+        return math.comb(left_a, 2 * x) * math.prod(range(2 * x - 1, 0, -2))
+    return math.comb(left_a, x) * math.comb(left_b, x) * math.factorial(x)
 
-    deck = Deck()
+def _canonical(states, twins, opponents, done=None):
+    """
+    states with the cards left of type done dropped and those of each group
+    of twin types sorted, merging the states that count the same, and
+    without the states with too few cards left for opponents hands.
+    """
+    counted = {}
+    for (left, hands), ways in states.items():
+        rest = list(left)
+        if done is not None:
+            rest[done] = 0
+        if hands + sum(rest) // 2 < opponents:
+            continue
+        for group in twins:
+            for t, size in zip(group, sorted(rest[t] for t in group)):
+                rest[t] = size
+        key = (tuple(rest), hands)
+        counted[key] = counted.get(key, 0) + ways
+    return counted
 
-    for card in board + hand: 
-        deck.cards.remove(card)
-    
-    hero_score = evaluator.evaluate(board, hand)
-    hero_class = evaluator.get_rank_class(hero_score)
+def _special_twins(adjacent, special):
+    """
+    A copy of adjacent with only the hands between two special cards
+    changed, so that each special card becomes a twin of a card with the
+    same neighbours among the other cards (its host) if it has one, or else
+    of the special cards with the same neighbours as it. E.g. with a
+    three-flush board a card of the flush suit makes the same hands as the
+    other cards of its rank with everything but another card of the suit.
+    """
+    others = [c for c in range(len(adjacent)) if c not in set(special)]
+    host = {}
+    # whether the cards hosted by a card make a hand with it
+    pairing = {}
+    for u in special:
+        for h in others:
+            rest = [c for c in others if c != h]
+            if np.array_equal(adjacent[u, rest], adjacent[h, rest]):
+                if pairing.setdefault(h, adjacent[u, h]) == adjacent[u, h]:
+                    host[u] = h
+                break
 
-    # for all possible starting hands the opponent could have
-    for oppcards_1 in itertools.combinations(deck.cards, 2):
+    changed = adjacent.copy()
+    for u in special:
+        for v in special:
+            if u == v:
+                continue
+            if u in host and v in host:
+                changed[u, v] = adjacent[host[u], host[v]] if host[u] != host[v] else pairing[host[u]]
+            elif u in host or v in host:
+                changed[u, v] = adjacent[host[u], v] if u in host else adjacent[u, host[v]]
+            else:
+                changed[u, v] = False
+    return changed
 
-        oppcards1 = list(oppcards_1)
+def _matchings(opphands, num_cards, opponents, special=()):
+    """
+    Number of ways to pick opponents hands out of opphands that share no
+    card (k-matchings of the graph on the live cards whose edges are
+    opphands, k = opponents).
 
-        # Remove the cards from the deck.
-        for card in oppcards1:
-            deck.cards.remove(card)
+    The cards are merged into types of interchangeable cards, so the graph
+    is a blow-up of a small graph on the types, and the hands are counted
+    type pair by type pair: for each pair, how many hands to take between
+    them, out of the cards of each type left, keeping the number of ways
+    for every (cards left of each type, hands) state. A type's cards left
+    stop mattering once all its pairs are done, and types that are
+    interchangeable in what's left only count as their sorted card counts,
+    so the states stay in the thousands.
 
-        villain_score1 = evaluator.evaluate(board, oppcards1)
+    special cards (those of the suit the board could flush in) are what
+    keeps a graph from having few types. They're made twins of other cards
+    by changing the hands between two of them (see _special_twins), and
+    the hands changed are put back by inclusion-exclusion: every matching
+    of the changed hands, +1 for each hand that is really there and -1 for
+    each that isn't, starts the counting with its cards taken out.
 
-        # all possible hands of second opponent
-        for oppcards_2 in itertools.combinations(deck.cards, 2):
+    Raises ValueError if more than MAX_STATES states are needed.
+    """
+    adjacent = np.zeros((num_cards, num_cards), dtype=bool)
+    adjacent[opphands[:, 0], opphands[:, 1]] = True
+    adjacent[opphands[:, 1], opphands[:, 0]] = True
+    special = list(special)
+    changed = _special_twins(adjacent, special) if special else adjacent
 
-            oppcards2 = list(oppcards_2)
+    types = _card_types(changed)
+    type_of = {card: t for t, cards in enumerate(types) for card in cards}
+    sizes = [len(cards) for cards in types]
+    linked = [[a != b and bool(changed[types[a][0], types[b][0]]) for b in range(len(types))]
+        for a in range(len(types))]
+    # whether two cards of the same type make a hand
+    paired = [len(cards) > 1 and bool(changed[cards[0], cards[1]]) for cards in types]
 
-            villain_score2 = evaluator.evaluate(board, oppcards2)
+    difference = adjacent.astype(np.int64) - changed.astype(np.int64)
+    states = {}
 
-            if hero_score < min(villain_score1, villain_score2):
-                wins += 1
-            elif hero_score == min(villain_score1, villain_score2):
-                ties += 1
-            else:
-                losses += 1
+    def start(i, left, hands, sign):
+        # every matching of the changed hands among special[i:]
+        if i == len(special):
+            key = (tuple(left), hands)
+            states[key] = states.get(key, 0) + sign
+            return
+        start(i + 1, left, hands, sign)
+        u = special[i]
+        if u not in taken and hands < opponents:
+            for v in special[i + 1:]:
+                if v not in taken and difference[u, v]:
+                    taken.update((u, v))
+                    left[type_of[u]] -= 1
+                    left[type_of[v]] -= 1
+                    start(i + 1, left, hands + 1, sign * int(difference[u, v]))
+                    left[type_of[u]] += 1
+                    left[type_of[v]] += 1
+                    taken.difference_update((u, v))
 
-        # adding the cards back
-        for card in oppcards1:
-            deck.cards.append(card)
+    taken = set()
+    start(0, list(sizes), 0, 1)
 
-    print("Hero best hand:")
-    Card.print_pretty_cards(evaluator.get_best_hand(board, hand))
-    print("Rank: ", hero_score)
-    print("Class: ", evaluator.class_to_string(hero_class))
+    left_types = list(range(len(types)))
+    states = _canonical(states, _twin_classes(left_types, linked, paired), opponents)
+    while left_types:
+        # the type with the fewest neighbours left is done next
+        a = min(left_types, key=lambda a: sum(linked[a][b] for b in left_types))
+        left_types.remove(a)
+        for b in ([a] if paired[a] else []) + [b for b in left_types if linked[a][b]]:
+            counted = {}
+            for (left, hands), ways in states.items():
+                for x in range(1 + min(opponents - hands, left[a] // 2 if b == a else min(left[a], left[b]))):
+                    rest = list(left)
+                    rest[a] -= x
+                    rest[b] -= x
+                    key = (tuple(rest), hands + x)
+                    counted[key] = counted.get(key, 0) + ways * _hands_between(left[a], left[b], x, b == a)
+            states = counted
+            if len(states) > MAX_STATES:
+                raise ValueError("too many ways to deal %d opponents to count exactly (over %d states)"
+                    % (opponents, MAX_STATES))
+
+        states = _canonical(states, _twin_classes(left_types, linked, paired), opponents, done=a)
+
+    return sum(ways for (left, hands), ways in states.items() if hands == opponents)
+
+def hse_n(board, hand, opponents):
+    """
+    Hand strength against opponents opponent hands: hand wins when it beats
+    all of them and ties when it ties the best of them. Counts are over all
+    ordered deals of the opponent hands, which don't share cards. For more
+    than two opponents they're the number of ways to pick opponents hands
+    that share no card out of the hands that are worse (or not better)
+    than hand, times the orders they can be dealt in (see _matchings).
+    Exact for any number of opponents, up to the 9 of a full table; raises
+    ValueError in the rare spots with too many ways to count.
+    """
+    hero_score = evaluator.evaluate(board, hand)
+    opphands, ranks, num_cards = _opponent_ranks(board, hand)
+    total = _opponent_deals(num_cards, opponents)
+
+    if opponents <= 2:
+        count = lambda hands: len(hands) if opponents == 1 else _disjoint_pairs(hands, num_cards)
+        worse = count(opphands[ranks > hero_score])
+        not_better = count(opphands[ranks >= hero_score])
+    else:
+        orders = math.factorial(opponents)
+        special = _flush_cards(board, hand)
+        worse = orders * _matchings(opphands[ranks > hero_score], num_cards, opponents, special)
+        not_better = orders * _matchings(opphands[ranks >= hero_score], num_cards, opponents, special)
+
+    wins = worse
+    ties = not_better - worse
+    losses = total - not_better
 
     print("Wins: ", wins)
     print("Losses: ", losses)
     print("Ties: ", ties)
 
     hse = (wins + ties / 2) / (wins + losses + ties)
-    print("HSE_2: ", hse)
+    print("HSE_%d: " % opponents, hse)
     return {
         "wins": wins,
         "losses": losses,
@@ -122,6 +283,38 @@ def hse_2(board, hand):
         "hse": hse
     }
 
+def hse_1(board, hand):
+    # Make sure there are at least 5 cards (3 from flop + 2 from hand)
+    if len(board) + len(hand) < 5:
+        print("Not enough cards to evaluate a valid hand. Add more cards (turn/river).")
+        return {
+            "wins": 0,
+            "losses": 0,
+            "ties": 0,
+            "hse": None
+        }
+
+    hero_score = evaluator.evaluate(board, hand)
+    hero_class = evaluator.get_rank_class(hero_score)
+
+    print("Hero best hand:")
+    Card.print_pretty_cards(evaluator.get_best_hand(board, hand))
+    print("Rank: ", hero_score)
+    print("Class: ", evaluator.class_to_string(hero_class))
+
+    return hse_n(board, hand, 1)
+
+def hse_2(board, hand):
+    hero_score = evaluator.evaluate(board, hand)
+    hero_class = evaluator.get_rank_class(hero_score)
+
+    print("Hero best hand:")
+    Card.print_pretty_cards(evaluator.get_best_hand(board, hand))
+    print("Rank: ", hero_score)
+    print("Class: ", evaluator.class_to_string(hero_class))
+
+    return hse_n(board, hand, 2)
+
 if __name__ == "__main__":
     hand = [Card.new('2s'), Card.new('3c')]
 
@@ -131,5 +324,8 @@ if __name__ == "__main__":
     print("------")
     h_2 = hse_2(board, hand)
     print("------")
-    print("Adjusted HSE for 2 players:", pow(h_1, 2))
-    print("HSE_2:", h_2)
+    h_9 = hse_n(board, hand, 9)
+    print("------")
+    print("Adjusted HSE for 2 players:", pow(h_1["hse"], 2))
+    print("HSE_2:", h_2["hse"])
+    print("HSE_9:", h_9["hse"])
@@ -0,0 +1,155 @@
+import csv
+import os
+import sys
+from functools import lru_cache
+import numpy as np
+from deuces.card import Card
+from deuces.deck import Deck
+from deuces.evaluator import get_evaluator
+from canonical import card_masks, canonicalize, orbits, suit_stabilizer
+from preflop_table import HAND_CLASSES, class_hand, hand_class
+
+evaluator = get_evaluator()
+
+MATCHUPS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_matchups.csv')
+
+def _cards_str(cards):
+    return ''.join(Card.int_to_str(c) for c in cards)
+
+def _str_cards(s):
+    return tuple(Card.new(s[i:i + 2]) for i in range(0, len(s), 2))
+
+def matchup_key(hero_hand, villain_hand):
+    """
+    Canonical form of a heads up preflop matchup, shared by all its suit
+    isomorphic matchups, and how many ordered matchups share it.
+    """
+    hero, villain, count = canonicalize(hero_hand, villain_hand)
+    return (tuple(hero), tuple(villain)), count
+
+def _hero_matchups(hero, villains, chunk=16):
+    """
+    Exact wins, ties and losses of hero against each villain hand: the
+    boards are all C(50,5) boards around hero, scored once for hero, and
+    each villain only counts the boards that miss its cards.
+    """
+    deck = Deck.GetFullDeck()
+    for card in hero:
+        deck.remove(card)
+
+    boards = np.array(deck, dtype=np.int32)[Deck.GetCombinations(np.arange(len(deck)), 5)]
+    board_masks = card_masks(boards)
+
+    results = []
+    for start in range(0, len(villains), chunk):
+        hands = [list(hero)] + [list(v) for v in villains[start:start + chunk]]
+        scores = evaluator.evaluate_boards(boards, hands)
+        for villain, villain_scores in zip(villains[start:start + chunk], scores[1:]):
+            live = (board_masks & card_masks([villain])[0]) == 0
+            wins = int(np.count_nonzero(live & (scores[0] < villain_scores)))
+            ties = int(np.count_nonzero(live & (scores[0] == villain_scores)))
+            losses = int(np.count_nonzero(live)) - wins - ties
+            results.append((wins, ties, losses))
+
+    return results
+
+def build_matchups(path=MATCHUPS_PATH):
+    """
+    Build step: exact heads up odds of every preflop matchup of two hands,
+    one row per class of suit isomorphic matchups. A matchup and its
+    reverse (villain against hero) only get one row between them. Takes
+    around an hour.
+    """
+    done = {}
+    for i, name in enumerate(HAND_CLASSES):
+        hero = class_hand(name)
+        deck = Deck.GetFullDeck()
+        for card in hero:
+            deck.remove(card)
+
+        # one villain hand per class of suit isomorphic hands around hero
+        villains, _ = orbits(Deck.GetCombinations(deck, 2), suit_stabilizer(hero))
+
+        todo = []
+        for villain in villains.tolist():
+            key, count = matchup_key(hero, villain)
+            reverse, _ = matchup_key(villain, hero)
+            if key not in done and reverse not in done:
+                todo.append((key, count, villain))
+
+        counts = _hero_matchups(hero, [villain for _, _, villain in todo])
+        for (key, count, _), (wins, ties, losses) in zip(todo, counts):
+            done[key] = (count, wins, ties, losses)
+        print("%s done (%d/%d)" % (name, i + 1, len(HAND_CLASSES)))
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Hero', 'Villain', 'Count', 'Wins', 'Ties', 'Losses'])
+        for (hero, villain), row in done.items():
+            writer.writerow([_cards_str(hero), _cards_str(villain)] + list(row))
+
+@lru_cache(maxsize=None)
+def load_matchups(path=MATCHUPS_PATH):
+    """
+    Reads a table written by build_matchups into {canonical matchup:
+    (count, wins, ties, losses)}. Empty if the table hasn't been built.
+    """
+    table = {}
+    if not os.path.exists(path):
+        return table
+
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            table[(_str_cards(row['Hero']), _str_cards(row['Villain']))] = (
+                int(row['Count']), int(row['Wins']), int(row['Ties']), int(row['Losses']))
+    return table
+
+def preflop_matchup(hero_hand, villain_hand):
+    """
+    Precomputed exact preflop odds of hero_hand against villain_hand, in the
+    same form as exact_odds, or None if the table hasn't been built.
+    """
+    table = load_matchups()
+    key, _ = matchup_key(hero_hand, villain_hand)
+    if key in table:
+        _, wins, ties, losses = table[key]
+    else:
+        key, _ = matchup_key(villain_hand, hero_hand)
+        if key not in table:
+            return None
+        _, losses, ties, wins = table[key]
+
+    return {
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "equity": (wins + ties / 2) / (wins + losses + ties)
+    }
+
+@lru_cache(maxsize=None)
+def matchup_matrix():
+    """
+    169 x 169 matrix of preflop equities between starting hand classes, in
+    HAND_CLASSES order: row class against column class, over all the
+    combinations of the two classes that don't share a card.
+    """
+    index = {name: i for i, name in enumerate(HAND_CLASSES)}
+    points = np.zeros((len(HAND_CLASSES), len(HAND_CLASSES)))
+    boards = np.zeros((len(HAND_CLASSES), len(HAND_CLASSES)))
+
+    for (hero, villain), (count, wins, ties, losses) in load_matchups().items():
+        i, j = index[hand_class(hero)], index[hand_class(villain)]
+        total = wins + ties + losses
+        points[i, j] += count * (wins + ties / 2) / total
+        boards[i, j] += count
+
+        # the reverse matchup, unless it's the same class of matchups
+        if matchup_key(villain, hero)[0] != (hero, villain):
+            points[j, i] += count * (losses + ties / 2) / total
+            boards[j, i] += count
+
+    return points / boards
+
+if __name__ == "__main__":
+    # python matchups.py rebuilds preflop_matchups.csv
+    build_matchups(*sys.argv[1:2])
@@ -1,29 +1,105 @@
-import itertools
+import time
+from functools import lru_cache
+import numpy as np
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import get_evaluator
+from matchups import preflop_matchup
+from sampling import SCALAR_BLOCK, LiveDeck, deal_block, equity_error, equity_interval, run_blocks
 
 deck = Deck()
-evaluator = Evaluator()
-
-def mc_odds_calculator(hero_hand, villain_hand):
+evaluator = get_evaluator()
+
+def mc_odds(hero_hand, villain_hand, board=[], trials=100000, seed=None, block=50000,
+        target_stderr=None, max_time=None, part=(0, 1)):
+    """
+    Monte Carlo heads up odds, in the same form as exact_odds plus the
+    standard error of the equity and its 95% confidence interval (see
+    equity_interval): deals the rest of the board block trials at a time as
+    one (block, 5 - len(board)) array, scores both hands on the whole block
+    with evaluate_boards and counts hero's wins, ties and losses with array
+    reductions.
+
+    With target_stderr and/or max_time it stops as soon as the standard
+    error is down to target_stderr or max_time seconds have gone by, with
+    trials as the most it will deal.
+
+    Every block is dealt from its own random stream spawned from seed, and
+    part = (index, parts) deals only that part's share of the blocks, so
+    the counts of the parts of a run add up to the serial run's (see
+    run_blocks); it can't be combined with target_stderr or max_time.
+    """
+    deck = Deck.GetFullDeck()
+    for card in hero_hand + villain_hand + board:
+        deck.remove(card)
+
+    adaptive = target_stderr is not None or max_time is not None
+    start = time.perf_counter()
+
+    wins = 0
+    ties = 0
+    done = 0
+    for n, stream in run_blocks(trials, block, seed, adaptive, part):
+        boards = deal_block(deck, n, 5 - len(board), np.random.default_rng(stream))
+        if board:
+            boards = np.column_stack((np.broadcast_to(np.array(board), (n, len(board))), boards))
+
+        hero_scores, villain_scores = evaluator.evaluate_boards(boards, [hero_hand, villain_hand])
+        wins += int(np.count_nonzero(hero_scores < villain_scores))
+        ties += int(np.count_nonzero(hero_scores == villain_scores))
+        done += n
+
+        if target_stderr is not None and equity_error(wins, ties, done - wins - ties) <= target_stderr:
+            break
+        if max_time is not None and time.perf_counter() - start >= max_time:
+            break
+
+    return odds_result(wins, ties, done - wins - ties)
+
+def odds_result(wins, ties, losses):
+    """
+    mc_odds's result for hero's Monte Carlo wins, ties and losses.
+    """
+    equity = (wins + ties / 2) / (wins + losses + ties)
+    stderr = float(equity_error(wins, ties, losses))
+    return {
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "equity": equity,
+        "stderr": stderr,
+        "ci": equity_interval(wins, ties, losses)
+    }
+
+# block=None runs the trials one at a time, target_stderr / max_time stop
+# block runs early (see mc_odds). It returns win ratios, which can't be
+# added up, so a run split over workers goes through mc_odds's counts
+def mc_odds_calculator(hero_hand, villain_hand, iterations=100000, seed=None, block=50000,
+        target_stderr=None, max_time=None):
     hero_wins = 0
     villain_wins = 0
 
-    for i in range(100000):
-        deck = Deck()
+    if block:
+        odds = mc_odds(hero_hand, villain_hand, trials=iterations, seed=seed, block=block,
+            target_stderr=target_stderr, max_time=max_time)
+        hero_wins = odds["wins"]
+        villain_wins = odds["losses"]
+        print("Trials: ", odds["wins"] + odds["losses"] + odds["ties"])
+        print("Equity std. error: ", odds["stderr"])
+    else:
+        for n, stream in run_blocks(iterations, SCALAR_BLOCK, seed):
+            live = LiveDeck(hero_hand + villain_hand, stream)
 
-        for card in hero_hand + villain_hand:
-            deck.cards.remove(card)
-        board = deck.draw(5)
+            for i in range(n):
+                board = live.deal(5)
 
-        hero_score = evaluator.evaluate(list(board), hero_hand)
-        villain_score = evaluator.evaluate(list(board), villain_hand)
+                hero_score = evaluator.evaluate(board, hero_hand)
+                villain_score = evaluator.evaluate(board, villain_hand)
 
-        if hero_score < villain_score:
-            hero_wins += 1
-        elif hero_score > villain_score:
-            villain_wins += 1
+                if hero_score < villain_score:
+                    hero_wins += 1
+                elif hero_score > villain_score:
+                    villain_wins += 1
 
     w_1 = hero_wins / (hero_wins + villain_wins)
     w_2 = villain_wins / (hero_wins + villain_wins)
@@ -33,24 +109,53 @@ def mc_odds_calculator(hero_hand, villain_hand):
 
     return w_1, w_2
 
-def odds_calculator(hero_hand, villain_hand):
-    hero_wins = 0
-    villain_wins = 0
-
-    deck = Deck()
-
-    for card in hero_hand + villain_hand:
-        deck.cards.remove(card)
+@lru_cache(maxsize=None)
+def runout_indices(num_cards, num_runout):
+    # every way to pick the rest of the board out of num_cards live cards, as
+    # indices into the live deck so any two hands share the same array
+    return Deck.GetCombinations(np.arange(num_cards), num_runout)
+
+def exact_odds(hero_hand, villain_hand, board=[], use_table=True):
+    """
+    Exact heads up odds: scores both hands on every possible completion of
+    the board (all C(48,5) = 1,712,304 boards preflop) and counts hero's 
+    wins, ties and losses. Both hands are scored in one evaluate_boards 
+    call, so each board's rank histogram is only worked out once.
+
+    Preflop odds are looked up in the precomputed matchup table 
+    (matchups.py) when it has been built, use_table=False always computes.
+    """
+    if not board and use_table:
+        precomputed = preflop_matchup(hero_hand, villain_hand)
+        if precomputed is not None:
+            return precomputed
+
+    deck = Deck.GetFullDeck()
+    for card in hero_hand + villain_hand + board:
+        deck.remove(card)
+
+    boards = np.array(deck)[runout_indices(len(deck), 5 - len(board))]
+    if board:
+        known = np.broadcast_to(np.array(board), (len(boards), len(board)))
+        boards = np.column_stack((known, boards))
+
+    hero_scores, villain_scores = evaluator.evaluate_boards(boards, [hero_hand, villain_hand])
+
+    wins = int(np.count_nonzero(hero_scores < villain_scores))
+    ties = int(np.count_nonzero(hero_scores == villain_scores))
+    losses = len(boards) - wins - ties
+
+    return {
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "equity": (wins + ties / 2) / (wins + losses + ties)
+    }
 
-    # all possible boards
-    for board in itertools.combinations(deck.cards, 5):
-        hero_score = evaluator.evaluate(list(board), hero_hand)
-        villain_score = evaluator.evaluate(list(board), villain_hand)
-
-        if hero_score < villain_score:
-            hero_wins += 1
-        elif hero_score > villain_score:
-            villain_wins += 1
+def odds_calculator(hero_hand, villain_hand):
+    odds = exact_odds(hero_hand, villain_hand)
+    hero_wins = odds["wins"]
+    villain_wins = odds["losses"]
 
     hero_wp = hero_wins / (hero_wins + villain_wins)
     villain_wp = villain_wins / (hero_wins + villain_wins)
@@ -1,8 +1,8 @@
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import get_evaluator
 
-evaluator = Evaluator()
+evaluator = get_evaluator()
 
 def percentage_rank(board, hand):
     rank = evaluator.evaluate(board, hand)
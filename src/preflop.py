@@ -1,58 +1,135 @@
-from deuces import Card, Evaluator, Deck
-import itertools
-
-evaluator = Evaluator()
-
-def preflop_monte_carlo(hand, num_opps, iterations=100000):
+from deuces import Card, Deck, get_evaluator
+from canonical import orbits, suit_stabilizer
+from odds import exact_odds
+from preflop_table import ESTIMATORS, MAX_OPPONENTS, estimate_class, preflop_lookup, simulate_class
+from sampling import SCALAR_BLOCK, LiveDeck, equity_error, run_blocks
+
+evaluator = get_evaluator()
+
+# trials simulated when iterations isn't given and the table can't answer
+DEFAULT_ITERATIONS = 100000
+
+# sweep: one simulation plays hand against 1 .. num_opps - 1 opponents at
+# once (num_opps counts the players at the table, hand included, so 10 gives
+# the whole 2 - 10 player curve): each deal has num_opps - 1 opponents and
+# hand is scored against the first k of them for every k.
+# results come from the precomputed table (preflop_table.py) when it has
+# every spot and the run asks for nothing its counts aren't (see
+# table_answers), otherwise iterations trials (DEFAULT_ITERATIONS if not
+# given) are simulated, use_table=False always simulates, block=None one
+# trial at a time, target_stderr / max_time stop block runs early (see simulate_class),
+# estimator='exchange' / 'stratified' pick a lower variance estimate (see
+# estimate_class), which deals MAX_OPPONENTS opponents to average over (so
+# it needs block runs and num_opps - 1 <= MAX_OPPONENTS), part splits a
+# seeded run over workers (see run_blocks)
+def preflop_monte_carlo(hand, num_opps, iterations=None, use_table=True, seed=None, block=50000,
+        target_stderr=None, max_time=None, estimator='plain', part=(0, 1)):
+    max_opps = num_opps - 1
+
+    if estimator not in ESTIMATORS:
+        raise ValueError("estimator must be one of %s" % (ESTIMATORS,))
+    if estimator != 'plain' and not block:
+        raise ValueError("estimator %r needs block runs (block=None plays plain trials)" % estimator)
+    if estimator != 'plain' and max_opps > MAX_OPPONENTS:
+        raise ValueError("estimator %r deals at most %d opponents, not %d" % (estimator, MAX_OPPONENTS, max_opps))
+
+    if use_table and table_answers(iterations, seed, target_stderr, max_time, estimator, part):
+        precomputed = [preflop_lookup(hand, num_players) for num_players in range(1, num_opps)]
+        if all(precomputed):
+            return [dict(result) for result in precomputed]
+    if iterations is None:
+        iterations = DEFAULT_ITERATIONS
+
+    variance_reduction = None
+    if block and estimator != 'plain':
+        estimate = estimate_class(hand, iterations, MAX_OPPONENTS, seed, block, estimator,
+            target_stderr, max_time, part)
+        wins = estimate["wins"][:max_opps].tolist()
+        ties = estimate["ties"][:max_opps].tolist()
+        losses = estimate["losses"][:max_opps].tolist()
+        stderr = estimate["stderr"][:max_opps].tolist()
+        variance_reduction = estimate["variance_reduction"][:max_opps].tolist()
+    elif block:
+        # whole blocks of deals scored at once
+        block_wins, block_ties, block_losses = simulate_class(hand, iterations, max_opps, seed, block,
+            target_stderr, max_time, part)
+        wins = block_wins.tolist()
+        ties = block_ties.tolist()
+        losses = block_losses.tolist()
+        stderr = equity_error(block_wins, block_ties, block_losses).tolist()
+    else:
+        wins = [0] * max_opps
+        ties = [0] * max_opps
+        losses = [0] * max_opps
+
+        for n, stream in run_blocks(iterations, SCALAR_BLOCK, seed, part=part):
+            live = LiveDeck(hand, stream)
+
+            for i in range(n):
+
+                cards = live.deal(5 + 2 * max_opps)
+                board = cards[:5]
+
+                hero_score = evaluator.evaluate(board, hand)
+
+                best_score = 7463  # rank one worse than worst hand
+                for k in range(max_opps):
+                    villain_hand = cards[5 + 2 * k:7 + 2 * k]
+                    best_score = min(best_score, evaluator.evaluate(board, villain_hand))
+
+                    if hero_score < best_score:
+                        wins[k] += 1
+                    elif hero_score == best_score:
+                        ties[k] += 1
+                    else:
+                        losses[k] += 1
+
+        stderr = [float(equity_error(w, t, l)) for w, t, l in zip(wins, ties, losses)]
+
+    return preflop_results(wins, ties, losses, stderr, variance_reduction)
+
+
+def table_answers(iterations=None, seed=None, target_stderr=None, max_time=None, estimator='plain',
+        part=(0, 1)):
+    """
+    Whether a run with these arguments can be answered from the precomputed
+    table: only a plain, unseeded, whole run with the default iterations.
+    """
+    return (iterations is None and seed is None and target_stderr is None and max_time is None
+        and estimator == 'plain' and tuple(part) == (0, 1))
+
+
+def preflop_results(wins, ties, losses, stderr, variance_reduction=None):
+    """
+    preflop_monte_carlo's results from lists of wins, ties, losses and
+    standard errors against 1, 2, ... opponents.
+    """
     results = []
-    for num_players in range(1, num_opps):
-        wins = 0
-        ties = 0
-        losses = 0
-
-        for i in range(iterations):
-
-            deck = Deck()
-            for card in hand:
-                deck.cards.remove(card)
-
-            board = deck.draw(5)
-
-            hero_score = evaluator.evaluate(board, hand)
-
-            villain_hands = []
-            villain_scores = []
-            for i in range(num_players):
-                villain_hand = deck.draw(2)
-                villain_hands.append(villain_hand)
-                villain_scores.append(evaluator.evaluate(board, villain_hand))
-            
-            if hero_score < min(villain_scores):
-                wins += 1
-            elif hero_score == min(villain_scores):
-                ties += 1
-            else:
-                losses += 1
-
-        mc_IR = (wins + ties / 2) / (wins + losses + ties)
-        # print("Number of Opponents: ", num_players)
-        # print("Wins: ", wins)
-        # print("Losses: ", losses)
-        # print("Ties: ", ties)
+    for k in range(len(wins)):
+        mc_IR = (wins[k] + ties[k] / 2) / (wins[k] + losses[k] + ties[k])
+        # print("Number of Opponents: ", k + 1)
+        # print("Wins: ", wins[k])
+        # print("Losses: ", losses[k])
+        # print("Ties: ", ties[k])
         # print("Monte Carlo IR: ", mc_IR)
-        
+
         results.append({
-            "opponents": num_players,
-            "wins": wins,
-            "losses": losses,
-            "ties": ties,
-            "mc_IR": mc_IR
+            "opponents": k + 1,
+            "wins": wins[k],
+            "losses": losses[k],
+            "ties": ties[k],
+            "mc_IR": mc_IR,
+            "stderr": stderr[k]
         })
+        if variance_reduction is not None:
+            results[-1]["variance_reduction"] = variance_reduction[k]
 
-        return results
+    return results
 
 
-# wont run - approx 2 billion cases 
+# exact: every opponent hand against every board, approx 2 billion cases, so
+# only one opponent hand per class of suit isomorphic hands is played out
+# (weighted by the class size) and each one goes through exact_odds
 def preflop_ir(hand):
     wins = 0
     ties = 0
@@ -62,37 +139,29 @@ def preflop_ir(hand):
     for card in hand:
         deck.cards.remove(card)
 
-    for oppcards in itertools.combinations(deck.cards, 2):
-
-        oppcards = list(oppcards)
-
-        # Remove the cards from the deck.
-        for card in oppcards:
-            deck.cards.remove(card)
-
-        for board in itertools.combinations(deck.cards, 5):
-            
-            board = list(board)
+    group = suit_stabilizer(hand)
+    opphands, weights = orbits(Deck.GetCombinations(deck.cards, 2), group)
 
-            hero_score = evaluator.evaluate(board, hand)
-            villain_score = evaluator.evaluate(board, oppcards)
+    for oppcards, weight in zip(opphands.tolist(), weights.tolist()):
 
-            if hero_score < villain_score:
-                wins += 1
-            elif hero_score == villain_score:
-                ties += 1
-            else:
-                losses += 1
+        odds = exact_odds(hand, oppcards)
 
-        # Restore the cards to the deck.
-        for card in oppcards:
-            deck.cards.append(card)
+        wins += weight * odds["wins"]
+        ties += weight * odds["ties"]
+        losses += weight * odds["losses"]
 
-    mc_IR = (wins + ties / 2) / (wins + losses + ties)
+    IR = (wins + ties / 2) / (wins + losses + ties)
     print("Wins: ", wins)
     print("Losses: ", losses)
     print("Ties: ", ties)
-    print("IR: ", mc_IR)
+    print("IR: ", IR)
+
+    return {
+        "wins": wins,
+        "losses": losses,
+        "ties": ties,
+        "IR": IR
+    }
 
 
 if __name__ == '__main__':
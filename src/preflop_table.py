@@ -0,0 +1,312 @@
+import csv
+import itertools
+import math
+import os
+import sys
+import time
+from functools import lru_cache
+import numpy as np
+from deuces.card import Card
+from deuces.deck import Deck
+from deuces.evaluator import get_evaluator
+from deuces.lookup import LookupTable
+from sampling import deal_block, equity_error, run_blocks
+
+evaluator = get_evaluator()
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_ir_table.csv')
+MAX_OPPONENTS = 9
+
+# the 169 starting hand classes, named and ordered like preflop_equity.csv
+RANKS = 'AKQJT98765432'
+HAND_CLASSES = []
+for i, high in enumerate(RANKS):
+    HAND_CLASSES.append(high + high + 'o')
+    for low in RANKS[i + 1:]:
+        HAND_CLASSES.append(high + low + 's')
+        HAND_CLASSES.append(high + low + 'o')
+
+def hand_class(hand):
+    """
+    Name of the starting hand class of two hole cards, e.g. 'AKs', 'T9o' or
+    'QQo' (pairs get an 'o' like in preflop_equity.csv).
+    """
+    high, low = sorted(hand, key=Card.get_rank_int, reverse=True)
+    suited = Card.get_suit_int(high) == Card.get_suit_int(low)
+    return (Card.STR_RANKS[Card.get_rank_int(high)] + Card.STR_RANKS[Card.get_rank_int(low)]
+        + ('s' if suited else 'o'))
+
+def class_hand(name):
+    """
+    Some hand of the starting hand class name. All hands of a class have the
+    same preflop income rate, by suit symmetry.
+    """
+    return [Card.new(name[0] + 's'), Card.new(name[1] + ('s' if name[2] == 's' else 'h'))]
+
+def _score_deals(hand, cards, num_opps):
+    """
+    Ranks of hand and of each of the first num_opps opponents on a block of
+    deals from deal_block (board first, then the opponents' hole cards), as
+    an (N,) and a (num_opps, N) array.
+    """
+    boards = cards[:, :5]
+    hero_scores = evaluator.evaluate_boards(boards, [hand])[0]
+    opp_scores = np.empty((num_opps, len(cards)), dtype=hero_scores.dtype)
+    for k in range(num_opps):
+        opp_scores[k] = evaluator.evaluate_batch(np.column_stack((cards[:, 5 + 2 * k:7 + 2 * k], boards)))
+    return hero_scores, opp_scores
+
+def simulate_class(hand, trials, max_opps=MAX_OPPONENTS, seed=None, block=20000,
+        target_stderr=None, max_time=None, part=(0, 1)):
+    """
+    Deals trials boards and max_opps opponent hands around hand, and plays
+    hand against the first k opponents of each deal for every k at once.
+    Returns the wins, ties and losses against k = 1 .. max_opps opponents,
+    counting a tie whenever hand ties the best opponent (as in
+    preflop_monte_carlo).
+
+    With target_stderr and/or max_time it stops early, once the standard
+    error of every k's income rate is down to target_stderr or after
+    max_time seconds, so the counts may add up to fewer than trials.
+
+    part = (index, parts) deals only that part's share of the blocks, each
+    from its own stream spawned from seed, so the parts of a run add up to
+    the serial run (see run_blocks); it can't be combined with
+    target_stderr or max_time.
+    """
+    deck = Deck.GetFullDeck()
+    for card in hand:
+        deck.remove(card)
+    deck = np.array(deck)
+
+    needed = 5 + 2 * max_opps
+    wins = np.zeros(max_opps, dtype=np.int64)
+    ties = np.zeros(max_opps, dtype=np.int64)
+
+    adaptive = target_stderr is not None or max_time is not None
+    start = time.perf_counter()
+
+    done = 0
+    for n, stream in run_blocks(trials, block, seed, adaptive, part):
+        cards = deal_block(deck, n, needed, np.random.default_rng(stream))
+        hero_scores, opp_scores = _score_deals(hand, cards, max_opps)
+
+        # best[k] = best of the first k + 1 opponents
+        best = np.minimum.accumulate(opp_scores, axis=0)
+        wins += np.count_nonzero(hero_scores < best, axis=1)
+        ties += np.count_nonzero(hero_scores == best, axis=1)
+
+        done += n
+
+        if target_stderr is not None and equity_error(wins, ties, done - wins - ties).max() <= target_stderr:
+            break
+        if max_time is not None and time.perf_counter() - start >= max_time:
+            break
+
+    losses = done - wins - ties
+    return wins, ties, losses
+
+# ways of picking k of n opponents, SUBSETS[n, k]
+SUBSETS = np.array([[math.comb(n, k) for k in range(MAX_OPPONENTS + 1)]
+    for n in range(MAX_OPPONENTS + 1)], dtype=np.float64)
+
+# upper ends of the rank classes (straight flush, ..., high card)
+RANK_CLASS_MAX = [LookupTable.MAX_STRAIGHT_FLUSH, LookupTable.MAX_FOUR_OF_A_KIND,
+    LookupTable.MAX_FULL_HOUSE, LookupTable.MAX_FLUSH, LookupTable.MAX_STRAIGHT,
+    LookupTable.MAX_THREE_OF_A_KIND, LookupTable.MAX_TWO_PAIR, LookupTable.MAX_PAIR,
+    LookupTable.MAX_HIGH_CARD]
+TEXTURES = 4 * len(RANK_CLASS_MAX)
+
+ESTIMATORS = ('plain', 'exchange', 'stratified')
+
+def flop_texture(hand, flops):
+    """
+    Texture class of each of an (N, 3) array of flops as seen by hand: what
+    hand has made on the flop (its rank class) and how many flop cards share
+    a suit with it (0 to 3, the more of its two suits if it's offsuit). An
+    int in range(TEXTURES) per flop.
+    """
+    flops = np.asarray(flops)
+    made = np.searchsorted(RANK_CLASS_MAX, evaluator.evaluate_batch(
+        np.column_stack((np.broadcast_to(np.array(hand), (len(flops), 2)), flops))))
+    suits = (flops >> 12) & 0xF
+    flush_cards = np.max([np.count_nonzero(suits == Card.get_suit_int(card), axis=1) for card in hand], axis=0)
+    return 4 * made + flush_cards
+
+@lru_cache(maxsize=None)
+def texture_probabilities(hand):
+    """
+    Exact probability of each flop texture class for hand (a tuple), from
+    all 19,600 flops.
+    """
+    deck = np.array([card for card in Deck.GetFullDeck() if card not in hand])
+    flops = deck[np.array(list(itertools.combinations(range(len(deck)), 3)))]
+    return np.bincount(flop_texture(hand, flops), minlength=TEXTURES) / len(flops)
+
+def estimate_class(hand, trials, max_opps=MAX_OPPONENTS, seed=None, block=20000, estimator='exchange',
+        target_stderr=None, max_time=None, part=(0, 1)):
+    """
+    Income rate of hand against k = 1 .. max_opps opponents like
+    simulate_class, with a choice of estimator for the same deals:
+
+    - 'plain' plays hand against the first k opponents of each deal, as
+      simulate_class does.
+    - 'exchange' uses that the opponents are interchangeable: it plays hand
+      against every set of k of the max_opps opponents dealt and averages,
+      which needs no more evaluations than 'plain' (hand beats all of a set
+      exactly when it beats each of them, so counting the opponents it
+      beats is enough).
+    - 'stratified' is 'exchange' post-stratified over flop_texture, with the
+      exact class probabilities from texture_probabilities.
+
+    Returns a dict of arrays over k: the (expected) "wins", "ties" and
+    "losses" out of "trials" deals, the income rate "ir", its "stderr", and
+    "variance_reduction", the variance of the plain estimate over the
+    variance of this one for the same number of deals, plus the running sums
+    behind them for combine_estimates. target_stderr and max_time stop
+    early and part splits the run as in simulate_class (not both at once).
+    """
+    if estimator not in ESTIMATORS:
+        raise ValueError("estimator must be one of %s" % (ESTIMATORS,))
+
+    deck = Deck.GetFullDeck()
+    for card in hand:
+        deck.remove(card)
+    deck = np.array(deck)
+
+    needed = 5 + 2 * max_opps
+    subsets = SUBSETS[:max_opps + 1, 1:max_opps + 1] / SUBSETS[max_opps, 1:max_opps + 1]
+    strata = TEXTURES if estimator == 'stratified' else 1
+
+    # per stratum and k: deals, and sums of win and tie chances, of the
+    # estimate and its square, and of the plain estimate's square
+    counts = np.zeros(strata)
+    sums = np.zeros((5, strata, max_opps))
+
+    adaptive = target_stderr is not None or max_time is not None
+    start = time.perf_counter()
+
+    done = 0
+    for n, stream in run_blocks(trials, block, seed, adaptive, part):
+        cards = deal_block(deck, n, needed, np.random.default_rng(stream))
+        hero_scores, opp_scores = _score_deals(hand, cards, max_opps)
+
+        if estimator == 'plain':
+            best = np.minimum.accumulate(opp_scores, axis=0)
+            win = (hero_scores < best).astype(np.float64)
+            tie = (hero_scores == best).astype(np.float64)
+        else:
+            # chance that k opponents picked at random are all beaten / all
+            # beaten or tied
+            beaten = subsets[np.count_nonzero(opp_scores > hero_scores, axis=0)].T
+            win = beaten
+            tie = subsets[np.count_nonzero(opp_scores >= hero_scores, axis=0)].T - beaten
+        score = win + tie / 2
+
+        stratum = flop_texture(hand, cards[:, :3]) if strata > 1 else np.zeros(n, dtype=np.intp)
+        counts += np.bincount(stratum, minlength=strata)
+        for i, values in enumerate((win, tie, score, score ** 2, win + tie / 4)):
+            for k in range(max_opps):
+                sums[i, :, k] += np.bincount(stratum, values[k], minlength=strata)
+
+        done += n
+
+        if target_stderr is not None and _estimate(hand, counts, sums)["stderr"].max() <= target_stderr:
+            break
+        if max_time is not None and time.perf_counter() - start >= max_time:
+            break
+
+    return _estimate(hand, counts, sums)
+
+def combine_estimates(hand, estimates):
+    """
+    One estimate_class result for hand from the results of the parts of a
+    run (see part), as if it had been one run.
+    """
+    return _estimate(hand, sum(e["counts"] for e in estimates), sum(e["sums"] for e in estimates))
+
+def _estimate(hand, counts, sums):
+    """
+    estimate_class's result from its running sums per stratum, which it
+    keeps in the result ("counts", "sums") for combine_estimates.
+    """
+    done = int(counts.sum())
+    if len(counts) > 1:
+        weights = texture_probabilities(tuple(hand)) * (counts > 0)
+        weights /= weights.sum()
+    else:
+        weights = np.ones(1)
+    seen = np.maximum(counts, 1)[:, None]
+    win_rate, tie_rate, ir, _, plain_square = (weights @ (s / seen) for s in sums)
+    # within stratum variance only, since the strata are weighted exactly
+    within = weights @ (sums[3] / seen - (sums[2] / seen) ** 2)
+    stderr = np.sqrt(np.maximum(within, 0) / done)
+    plain_stderr = np.sqrt(np.maximum(plain_square - ir ** 2, 0) / done)
+
+    wins = win_rate * done
+    ties = tie_rate * done
+    return {
+        "trials": done,
+        "wins": wins,
+        "ties": ties,
+        "losses": done - wins - ties,
+        "ir": ir,
+        "stderr": stderr,
+        "variance_reduction": np.divide(plain_stderr ** 2, stderr ** 2, out=np.ones_like(ir), where=stderr > 0),
+        "counts": counts,
+        "sums": sums
+    }
+
+def build_table(trials=1000000, path=TABLE_PATH, seed=0):
+    """
+    Build step: simulates every starting hand class against 1 to 9 opponents
+    and writes the counts to path, one row per class and number of opponents.
+    At the default 1,000,000 deals per class the income rates are within
+    about +-0.1% (95%).
+    """
+    rows = []
+    for i, name in enumerate(HAND_CLASSES):
+        wins, ties, losses = simulate_class(class_hand(name), trials, seed=seed + i)
+        for k in range(MAX_OPPONENTS):
+            rows.append([name, k + 1, trials, wins[k], ties[k], losses[k]])
+        print("%s done (%d/%d)" % (name, i + 1, len(HAND_CLASSES)))
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Cards', 'Opponents', 'Trials', 'Wins', 'Ties', 'Losses'])
+        writer.writerows(rows)
+
+@lru_cache(maxsize=None)
+def load_table(path=TABLE_PATH):
+    """
+    Reads a table written by build_table into {(class, opponents): row}.
+    Empty if the table hasn't been built.
+    """
+    table = {}
+    if not os.path.exists(path):
+        return table
+
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            wins, ties, losses = int(row['Wins']), int(row['Ties']), int(row['Losses'])
+            table[(row['Cards'], int(row['Opponents']))] = {
+                "opponents": int(row['Opponents']),
+                "wins": wins,
+                "losses": losses,
+                "ties": ties,
+                "mc_IR": (wins + ties / 2) / (wins + losses + ties),
+                "stderr": float(equity_error(wins, ties, losses))
+            }
+    return table
+
+def preflop_lookup(hand, num_opps):
+    """
+    Precomputed preflop result of hand against num_opps opponents, in the
+    same form as a preflop_monte_carlo result, or None if it isn't in the
+    table.
+    """
+    return load_table().get((hand_class(hand), num_opps))
+
+if __name__ == "__main__":
+    # python preflop_table.py [trials] rebuilds preflop_ir_table.csv
+    build_table(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from deuces.evaluator import get_evaluator
+from odds import mc_odds, odds_result
+from preflop import DEFAULT_ITERATIONS, preflop_results, table_answers
+from preflop_table import MAX_OPPONENTS, combine_estimates, estimate_class, preflop_lookup, simulate_class
+from sampling import equity_error
+
+# Runs Monte Carlo simulations on a pool of worker processes: a run is cut
+# into its blocks (see run_blocks), every block is one job for the pool,
+# dealt from its own random stream, and the counts of the finished jobs are
+# merged as they come in. Since block i is dealt from stream i whichever
+# worker runs it, the merged counts equal a serial run with the same seed
+# and block.
+
+# worker processes are started by a forkserver rather than forked from the
+# app, whose threads (Streamlit's, the API's) may hold locks mid fork
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(workers=None):
+    """
+    The process wide pool of Monte Carlo workers with workers processes
+    (one per core by default), started on first use. Each number of workers
+    asked for gets its own pool, so callers never stop each other's jobs.
+    Each worker loads the evaluator on the shared lookup table once, when it
+    starts, and keeps it for every job.
+    """
+    workers = workers or os.cpu_count()
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver'),
+                initializer=get_evaluator)
+        return _pools[workers]
+
+def _run(function, args, trials, seed, block, workers, progress, cancel, **kwargs):
+    """
+    Runs function(*args, trials=trials, seed=..., block=block, part=...,
+    **kwargs) one block per job and returns the results of the jobs that
+    finished and whether the run was cancelled. progress(done, trials) is
+    called as each job finishes, and cancel() after it: once it returns True
+    the jobs that haven't started are dropped.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    blocks = -(-trials // block)
+    pool = get_pool(workers)
+
+    jobs = {}
+    for i in range(blocks):
+        job = pool.submit(function, *args, trials=trials, seed=root, block=block, part=(i, blocks), **kwargs)
+        jobs[job] = min(block, trials - i * block)
+
+    results = []
+    done = 0
+    cancelled = False
+    try:
+        for job in as_completed(jobs):
+            results.append(job.result())
+            done += jobs[job]
+            if progress is not None:
+                progress(done, trials)
+            if cancel is not None and cancel():
+                cancelled = done < trials
+                break
+    finally:
+        for job in jobs:
+            job.cancel()
+
+    return results, cancelled
+
+def run_odds(hero_hand, villain_hand, board=[], trials=100000, seed=None, block=10000, workers=None,
+        progress=None, cancel=None):
+    """
+    mc_odds on the worker pool: the same result as mc_odds with the same
+    seed and block, plus "cancelled" (True if cancel stopped it, in which
+    case the counts are those of the blocks that finished).
+    """
+    parts, cancelled = _run(mc_odds, (hero_hand, villain_hand, board), trials, seed, block, workers,
+        progress, cancel)
+
+    result = odds_result(sum(p["wins"] for p in parts), sum(p["ties"] for p in parts),
+        sum(p["losses"] for p in parts))
+    result["cancelled"] = cancelled
+    return result
+
+def run_preflop(hand, num_opps, iterations=None, use_table=True, seed=None, block=10000,
+        estimator='plain', workers=None, progress=None, cancel=None):
+    """
+    preflop_monte_carlo on the worker pool: results against 1 .. num_opps - 1
+    opponents, the same as preflop_monte_carlo with the same seed and block
+    (up to float rounding for estimator 'exchange' and 'stratified'). Each
+    result also has "cancelled", as in run_odds.
+    """
+    max_opps = num_opps - 1
+
+    if use_table and table_answers(iterations, seed, estimator=estimator):
+        precomputed = [preflop_lookup(hand, num_players) for num_players in range(1, num_opps)]
+        if all(precomputed):
+            return [dict(result, cancelled=False) for result in precomputed]
+    if iterations is None:
+        iterations = DEFAULT_ITERATIONS
+
+    if estimator != 'plain':
+        parts, cancelled = _run(estimate_class, (hand,), iterations, seed, block, workers, progress, cancel,
+            max_opps=MAX_OPPONENTS, estimator=estimator)
+        estimate = combine_estimates(hand, parts)
+        results = preflop_results(estimate["wins"][:max_opps].tolist(), estimate["ties"][:max_opps].tolist(),
+            estimate["losses"][:max_opps].tolist(), estimate["stderr"][:max_opps].tolist(),
+            estimate["variance_reduction"][:max_opps].tolist())
+    else:
+        parts, cancelled = _run(simulate_class, (hand,), iterations, seed, block, workers, progress, cancel,
+            max_opps=max_opps)
+        wins, ties, losses = (sum(p[i] for p in parts) for i in range(3))
+        results = preflop_results(wins.tolist(), ties.tolist(), losses.tolist(),
+            equity_error(wins, ties, losses).tolist())
+
+    for result in results:
+        result["cancelled"] = cancelled
+    return results
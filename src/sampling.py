@@ -0,0 +1,130 @@
+import random
+import numpy as np
+from deuces.deck import Deck
+
+# trials per random stream in runs dealt one trial at a time (block=None)
+SCALAR_BLOCK = 10000
+
+class LiveDeck:
+    """
+    The cards that are left once the dead cards (known hands and board) are
+    out, for dealing random runouts over and over.
+
+    The live cards are kept in one list for the whole run and each deal is a
+    partial Fisher-Yates shuffle of it: for each card needed, a random card
+    from the part that hasn't been dealt yet is swapped to the end, and the
+    last n cards are the deal. The list stays a permutation of the live
+    cards, so it never has to be rebuilt between deals, and nothing is
+    removed from or popped off it.
+    """
+
+    def __init__(self, dead=(), seed=None):
+        dead = set(dead)
+        self.cards = [card for card in Deck.GetFullDeck() if card not in dead]
+        if isinstance(seed, np.random.SeedSequence):
+            seed = int(seed.generate_state(1, np.uint64)[0])
+        self.rng = random.Random(seed)
+
+    def deal(self, n):
+        """
+        n distinct random live cards, as a new list.
+        """
+        cards = self.cards
+        rand = self.rng.random
+        last = len(cards)
+        for i in range(last - 1, last - 1 - n, -1):
+            j = int(rand() * (i + 1))
+            cards[i], cards[j] = cards[j], cards[i]
+        return cards[last - n:]
+
+def deal_block(cards, n, k, rng):
+    """
+    n independent deals of k distinct cards out of cards at once, as an
+    (n, k) array, each row a uniformly random deal in random order. rng is
+    a numpy Generator.
+    """
+    cards = np.asarray(cards)
+
+    if 4 * k > len(cards):
+        # every card gets a random key, and the k cards with the smallest
+        # keys, in key order, are the deal
+        keys = rng.random((n, len(cards)))
+        picked = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(keys, picked, axis=1), axis=1)
+        return cards[np.take_along_axis(picked, order, axis=1)]
+
+    # short deals: draw each column at random and redraw the rows where it
+    # hit a card that's already dealt, which leaves each column uniform over
+    # the cards not dealt yet
+    picked = np.empty((n, k), dtype=np.intp)
+    for i in range(k):
+        column = rng.integers(0, len(cards), n)
+        clash = np.flatnonzero((picked[:, :i] == column[:, None]).any(axis=1))
+        while len(clash):
+            column[clash] = rng.integers(0, len(cards), len(clash))
+            clash = clash[(picked[clash, :i] == column[clash, None]).any(axis=1)]
+        picked[:, i] = column
+    return cards[picked]
+
+def equity_error(wins, ties, losses):
+    """
+    Standard error of a Monte Carlo equity (wins + ties / 2) / trials, each
+    trial scoring 1, 1/2 or 0. Works elementwise on arrays of counts.
+    """
+    trials = wins + ties + losses
+    equity = (wins + ties / 2) / trials
+    variance = (wins + ties / 4) / trials - equity ** 2
+    return np.sqrt(np.maximum(variance, 0) / trials)
+
+def equity_interval(wins, ties, losses, z=1.96):
+    """
+    Wilson score interval of a Monte Carlo equity (95% for the default z),
+    counting a tie as half a win. Unlike equity +- z standard errors it
+    stays within [0, 1], however few the trials or lopsided the spot.
+    """
+    trials = wins + ties + losses
+    equity = (wins + ties / 2) / trials
+    centre = (equity + z * z / (2 * trials)) / (1 + z * z / trials)
+    half = z * np.sqrt(equity * (1 - equity) / trials + z * z / (4 * trials * trials)) / (1 + z * z / trials)
+    return max(float(centre - half), 0.0), min(float(centre + half), 1.0)
+
+def next_block(done, trials, block, adaptive):
+    """
+    Size of the next block of a run that has done trials so far out of at
+    most trials. Runs that stop early start at 1,000 trials and double up
+    to block, so an easy spot isn't dealt a whole block it doesn't need.
+    """
+    if adaptive:
+        block = min(block, max(1000, done))
+    return min(block, trials - done)
+
+def run_blocks(trials, block, seed=None, adaptive=False, part=(0, 1)):
+    """
+    Splits a run of trials into blocks (of next_block sizes) and yields
+    (n, stream) for each block this part of the run deals, stream being the
+    block's own SeedSequence.
+
+    Block i's stream is spawned from seed (an int, a SeedSequence or None
+    for fresh entropy) as child i, whichever process deals it, and part =
+    (index, parts) deals blocks index, index + parts, ... only. So with the
+    same seed the parts of a run split over parts workers add up to exactly
+    the serial run, part=(0, 1). With a seed of None the parts have to be
+    given one SeedSequence made up front.
+
+    A run that stops early (adaptive) can't be split: where it stops
+    depends on the counts of every block before, which no one part has,
+    so a part other than (0, 1) raises ValueError.
+    """
+    if adaptive and tuple(part) != (0, 1):
+        raise ValueError("a run that stops early (target_stderr / max_time) can't be split into parts")
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    index, parts = part
+    done = 0
+    i = 0
+    while done < trials:
+        n = next_block(done, trials, block, adaptive)
+        if i % parts == index:
+            yield n, np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (i,),
+                pool_size=root.pool_size)
+        done += n
+        i += 1
@@ -0,0 +1,222 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from deuces.deck import Deck
+from deuces.evaluator import get_evaluator
+from canonical import card_masks
+from hp import _count_potentials, _potentials
+
+evaluator = get_evaluator()
+
+class StreetSession:
+    """
+    Analysis of one flop street by street. The flop's enumeration is done
+    once, when the session starts: the rank of every two card hand left in
+    the deck on the flop, on the flop + each turn card, and on the flop +
+    each turn and river. That is everything HandPotential_2 on the flop
+    looks at, and everything hse_1 and HandPotential_1 need on the turn and
+    river of the same flop as well. So once the turn or river is dealt
+    they're worked out from a slice of the flop's ranks, leaving out the
+    opponent hands and runouts that hold the new cards, instead of being
+    enumerated again.
+
+    Results are the same as hse_1's (which prints, this doesn't) and
+    HandPotentials_1 / HandPotentials_2's, for any board that starts with
+    the flop.
+
+    StreetSession(flop, build=False) leaves the scoring to build(), which
+    goes chunk by chunk. Until it is done, results only count the opponent
+    hands scored so far, a random sample of them, so they're running
+    estimates of the exact ones.
+    """
+
+    def __init__(self, flop, build=True):
+        self.flop = list(flop)
+        self.deck = Deck.GetFullDeck()
+        for card in self.flop:
+            self.deck.remove(card)
+
+        self.index = {card: i for i, card in enumerate(self.deck)}
+        self.opphands = Deck.GetCombinations(self.deck, 2)
+        self.opp_masks = card_masks(self.opphands)
+        self.card_masks = card_masks(np.array(self.deck).reshape(-1, 1))
+
+        # runout (turn, river) pair of deck indices i < j => its column
+        pairs = Deck.GetCombinations(np.arange(len(self.deck)), 2)
+        self.pair_column = np.zeros((len(self.deck), len(self.deck)), dtype=np.intp)
+        self.pair_column[pairs[:, 0], pairs[:, 1]] = np.arange(len(pairs))
+        self.pair_column[pairs[:, 1], pairs[:, 0]] = np.arange(len(pairs))
+        self.pair_masks = self.card_masks[pairs[:, 0]] | self.card_masks[pairs[:, 1]]
+
+        flop = np.array(self.flop)
+        deck = np.array(self.deck)
+        self.flop_board = flop.reshape(1, -1)
+        self.turn_boards = np.column_stack((np.broadcast_to(flop, (len(deck), 3)), deck))
+        self.river_boards = np.column_stack((np.broadcast_to(flop, (len(pairs), 3)), deck[pairs]))
+
+        self.flop_ranks = np.zeros(len(self.opphands), dtype=np.int32)
+        self.turn_ranks = np.zeros((len(self.opphands), len(self.turn_boards)), dtype=np.int32)
+        self.river_ranks = np.zeros((len(self.opphands), len(self.river_boards)), dtype=np.int32)
+        self.scored = np.zeros(len(self.opphands), dtype=bool)
+
+        self.turn_clash = (self.opp_masks[:, None] & self.card_masks[None, :]) != 0
+        self.river_clash = (self.opp_masks[:, None] & self.pair_masks[None, :]) != 0
+
+        if build:
+            for _ in self.build(chunks=1):
+                pass
+
+    def build(self, first=(), chunks=16, seed=0):
+        """
+        Scores the hands that haven't been scored yet in chunks hands at a
+        time: the hands in first (the known hands, whose own ranks every
+        result needs) and then the others in random order. Yields the
+        fraction of hands scored after each chunk.
+        """
+        first = [self._hand_index(hand) for hand in first]
+        rest = np.flatnonzero(~self.scored)
+        rest = np.random.default_rng(seed).permutation(rest[~np.isin(rest, first)])
+        order = np.concatenate((np.array(first, dtype=np.intp), rest))
+
+        for part in np.array_split(order, chunks):
+            hands = self.opphands[part].tolist()
+            self.flop_ranks[part] = evaluator.evaluate_boards(self.flop_board, hands)[:, 0]
+            self.turn_ranks[part] = evaluator.evaluate_boards(self.turn_boards, hands)
+            self.river_ranks[part] = evaluator.evaluate_boards(self.river_boards, hands)
+            self.scored[part] = True
+            yield np.count_nonzero(self.scored) / len(self.scored)
+
+    def done(self):
+        return bool(self.scored.all())
+
+    def _street(self, board):
+        """
+        The cards of board dealt after the flop, as deck indices, and their
+        card mask.
+        """
+        if sorted(board[:3]) != sorted(self.flop):
+            raise ValueError("board doesn't start with the session's flop")
+        later = [self.index[card] for card in board[3:]]
+        dead = 0
+        for i in later:
+            dead |= int(self.card_masks[i])
+        return later, dead
+
+    def _ranks(self, later):
+        """
+        Ranks of every hand on the flop plus the later cards.
+        """
+        if len(later) == 0:
+            return self.flop_ranks
+        if len(later) == 1:
+            return self.turn_ranks[:, later[0]]
+        return self.river_ranks[:, self.pair_column[later[0], later[1]]]
+
+    def _hand_index(self, hand):
+        return np.flatnonzero(self.opp_masks == int(card_masks([hand])[0]))[0]
+
+    def hse_1(self, board, hand):
+        """
+        hse_1(board, hand).
+        """
+        later, dead = self._street(board)
+        ranks = self._ranks(later)
+        ours = int(card_masks([hand])[0])
+        ourrank = ranks[self._hand_index(hand)]
+
+        live = ((self.opp_masks & (ours | dead)) == 0) & self.scored
+        wins = int(np.count_nonzero(ranks[live] > ourrank))
+        ties = int(np.count_nonzero(ranks[live] == ourrank))
+        losses = int(np.count_nonzero(live)) - wins - ties
+        return {
+            "wins": wins,
+            "losses": losses,
+            "ties": ties,
+            "hse": (wins + ties / 2) / (wins + losses + ties)
+        }
+
+    def _hand_potentials(self, board, hands, num_next):
+        later, dead = self._street(board)
+        if len(later) + num_next > 2:
+            raise ValueError("only %d cards left to come" % (2 - len(later)))
+
+        ranks = self._ranks(later)
+        if len(later) == 0 and num_next == 1:
+            bests, runout_masks, clash = self.turn_ranks, self.card_masks, self.turn_clash
+        elif len(later) == 0:
+            bests, runout_masks, clash = self.river_ranks, self.pair_masks, self.river_clash
+        else:
+            # river after the turn: the (turn, river) columns, the turn's own
+            # column left out as a dead runout
+            columns = self.pair_column[later[0]]
+            bests = self.river_ranks[:, columns]
+            runout_masks = self.card_masks
+            clash = self.turn_clash
+
+        results = []
+        for hand in hands:
+            ours = int(card_masks([hand])[0])
+            HP, HPTotal = _count_potentials(ranks, bests, self.opp_masks, runout_masks, clash,
+                self._hand_index(hand), ours | dead, self.scored)
+            Ppot, Npot = _potentials(HP, HPTotal)
+            results.append((Ppot, Npot, HPTotal))
+        return results
+
+    def HandPotentials_1(self, board, hands):
+        """
+        HandPotentials_1(board, hands), on the flop or the turn.
+        """
+        return self._hand_potentials(board, hands, 1)
+
+    def HandPotentials_2(self, board, hands):
+        """
+        HandPotentials_2(board, hands), on the flop.
+        """
+        return self._hand_potentials(board, hands, 2)
+
+# the sessions of the last 8 flops, least recently used first; sessions are
+# also kept from background threads (see background.AnalysisJob)
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+MAX_SESSIONS = 8
+
+def street_session(board):
+    """
+    The StreetSession of board's flop, shared by every board and hand on
+    that flop, built if there isn't one yet.
+    """
+    flop = tuple(sorted(board[:3]))
+    with _sessions_lock:
+        session = _sessions.get(flop)
+        if session is not None:
+            _sessions.move_to_end(flop)
+            return session
+    return keep_session(StreetSession(flop))
+
+def has_session(board):
+    """
+    Whether board's flop has a session, so its results are quick.
+    """
+    with _sessions_lock:
+        return tuple(sorted(board[:3])) in _sessions
+
+def keep_session(session):
+    """
+    Adds a fully built session (e.g. one built in the background) to the
+    kept ones, dropping the least recently used past MAX_SESSIONS, and
+    returns it.
+    """
+    with _sessions_lock:
+        _sessions[tuple(sorted(session.flop))] = session
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return session
+
+def hse_1(board, hand):
+    return street_session(board).hse_1(board, hand)
+
+def HandPotentials_1(board, hands):
+    return street_session(board).HandPotentials_1(board, hands)
+
+def HandPotentials_2(board, hands):
+    return street_session(board).HandPotentials_2(board, hands)
@@ -7,7 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Now import from deuces
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import Evaluator, get_evaluator
 
 from preflop import preflop_monte_carlo
 from hse import hse_1
@@ -18,7 +18,7 @@ from odds import mc_odds_calculator
 print(Evaluator.__module__)
 
 deck = Deck()
-evaluator = Evaluator()
+evaluator = get_evaluator()
 num_opps = 1
 
 # hero_hand = deck.draw(2)
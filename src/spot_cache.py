@@ -0,0 +1,186 @@
+import copy
+import functools
+import numbers
+import pickle
+import threading
+from collections import OrderedDict
+from canonical import SUIT_PERMUTATIONS, permute_suits
+from spot_store import SpotStore
+
+def spot_key(*card_sets):
+    """
+    Canonical key of a spot given as card sets (hands and board, in a fixed
+    order): for every suit relabelling, each set's cards sorted, and the
+    smallest of the results. Suit isomorphic spots share a key, and the key
+    is a plain tuple of ints, so it can be passed straight to an
+    st.cache_data function in place of the cards.
+    """
+    card_sets = [[int(card) for card in cards] for cards in card_sets]
+    return min(tuple(tuple(sorted(permute_suits(cards, perm))) for cards in card_sets)
+        for perm in SUIT_PERMUTATIONS)
+
+def _is_cards(arg):
+    return isinstance(arg, (list, tuple)) and all(isinstance(card, numbers.Integral) for card in arg)
+
+def _is_hands(arg):
+    return isinstance(arg, (list, tuple)) and len(arg) > 0 and all(_is_cards(cards) for cards in arg)
+
+class SpotCache:
+    """
+    Bounded cache of results of suit invariant analytics functions (HSE,
+    hand potentials, odds, ...), keyed by function, canonical spot and the
+    other arguments, that evicts the least recently used result once it
+    holds maxsize of them. Hits return a copy, like st.cache_data, so
+    callers can't change what's cached.
+
+    With a store (a spot_store.SpotStore) misses are looked up there before
+    they are computed, and what is computed is written there for other
+    processes and later runs.
+
+    It is shared by the app's session threads, so the results and counters
+    are only touched under a lock (results are computed outside it).
+    """
+
+    def __init__(self, maxsize=512, store=None):
+        self.maxsize = maxsize
+        self.store = store
+        self.results = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def cached(self, function, version=1, exact=False):
+        """
+        Decorator: function's results are looked up here before it is run.
+        Every argument that is a list of cards (a hand or a board) or a list
+        of hands is canonicalized together, the others are used as they are.
+        version is the version of function's algorithm, to be bumped when
+        its results change so the stored ones aren't used. exact=True keys
+        the cards as given (each set sorted) instead, for results that
+        aren't suit invariant, e.g. a seeded Monte Carlo run, whose deals
+        depend on which cards are out of the deck.
+
+        wrapper.lookup(*args, **kwargs) is the cached result, or None if
+        there isn't one, without running function, and wrapper.put(result,
+        *args, **kwargs) caches a result worked out elsewhere (e.g. by a
+        worker process), counting it as a miss. wrapper.peek is lookup
+        without counting a hit, for checking ahead of a call that will count
+        it.
+        """
+        def key(args, kwargs):
+            card_sets = []
+            shape = []
+            others = []
+            for arg in args:
+                if _is_cards(arg):
+                    card_sets.append(arg)
+                    shape.append(1)
+                elif _is_hands(arg):
+                    card_sets.extend(arg)
+                    shape.append(len(arg))
+                else:
+                    others.append(arg)
+                    shape.append(0)
+            if exact:
+                spot = ('exact',) + tuple(tuple(sorted(int(card) for card in cards)) for cards in card_sets)
+            else:
+                spot = spot_key(*card_sets)
+            return (function.__module__, function.__qualname__, tuple(shape), spot,
+                tuple(others), tuple(sorted(kwargs.items())))
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return self.get(key(args, kwargs), lambda: function(*args, **kwargs), version)
+
+        def put(result, *args, **kwargs):
+            with self.lock:
+                self.misses += 1
+            self.put(key(args, kwargs), result, version)
+
+        wrapper.lookup = lambda *args, **kwargs: self.lookup(key(args, kwargs), version)
+        wrapper.peek = lambda *args, **kwargs: self.lookup(key(args, kwargs), version, count=False)
+        wrapper.put = put
+        return wrapper
+
+    def get(self, key, compute, version=1):
+        """
+        The result cached under key (and stored under key and version), or
+        compute()'s, which is then cached and stored.
+        """
+        result = self.lookup(key, version)
+        if result is not None:
+            return result
+
+        with self.lock:
+            self.misses += 1
+        result = compute()
+        self.put(key, result, version)
+        return result
+
+    def put(self, key, result, version=1):
+        """
+        Caches and stores result under key and version.
+        """
+        if self.store is not None:
+            self.store.put(key, result, version)
+        self._keep(key, version, result)
+
+    def lookup(self, key, version=1, count=True):
+        """
+        The result cached or stored under key and version, or None. With
+        count=False it is only a look: no hit is counted and a stored result
+        isn't brought into the cache.
+        """
+        with self.lock:
+            if (key, version) in self.results:
+                self.hits += count
+                self.results.move_to_end((key, version))
+                return copy.deepcopy(self.results[(key, version)])
+
+        result = self.store.get(key, version) if self.store is not None else None
+        if result is not None and count:
+            with self.lock:
+                self.store_hits += 1
+            self._keep(key, version, result)
+        return result
+
+    def _keep(self, key, version, result):
+        kept = copy.deepcopy(result)
+        size = len(pickle.dumps(result))
+        with self.lock:
+            self.results[(key, version)] = kept
+            self.results.move_to_end((key, version))
+            self.sizes[(key, version)] = size
+            while len(self.results) > self.maxsize:
+                evicted, _ = self.results.popitem(last=False)
+                del self.sizes[evicted]
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.sizes.clear()
+            self.hits = 0
+            self.store_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Hits, hits from the store, misses, hit rate (counting both kinds of
+        hits), number of results held and their size in bytes (pickled).
+        """
+        with self.lock:
+            lookups = self.hits + self.store_hits + self.misses
+            return {
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+                "entries": len(self.results),
+                "bytes": sum(self.sizes.values())
+            }
+
+# the process wide cache the app's analytics go through, backed by the
+# store shared by the app's processes (opened on first use)
+results = SpotCache(store=SpotStore())
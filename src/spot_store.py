@@ -0,0 +1,175 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# shared by every app process on the machine, SPOT_STORE_PATH overrides it
+STORE_PATH = os.environ.get('SPOT_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'spot_store.sqlite'))
+
+class SpotStore:
+    """
+    Persistent store of computed results (HSE, hand potentials, odds, ...)
+    in an SQLite file, keyed by canonical spot (see spot_cache.spot_key) and
+    the version of the algorithm that computed them, so a result outlives
+    the process and is shared by every process using the same file.
+
+    The first process to compute a spot writes it and later writes of the
+    same key and version are ignored. Results of another version are never
+    returned, so bumping a function's version retires its old results (they
+    are evicted in time like any other). Once the results take up more than
+    max_bytes, the least recently read ones are deleted down to 90% of it.
+    When a result was read is noted in memory and written at most every
+    USED_INTERVAL seconds, so reads don't each cost a write. The size is
+    kept as a running total of this process's writes, re-read from the
+    file (which every process writes to) every SIZE_CHECK writes and after
+    an eviction, so writes don't each sum the whole store.
+
+    The file is opened on first use. If it can't be (e.g. a read only
+    install), the store holds nothing and the results are kept in memory
+    only, like the lookup table's.
+    """
+
+    # seconds between writes of when results were read
+    USED_INTERVAL = 30
+    # writes between re-reads of the store's size
+    SIZE_CHECK = 256
+
+    def __init__(self, path=STORE_PATH, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = None
+        self.failed = False
+        self.lock = threading.Lock()
+        # (key, version) -> when it was last read, not yet written
+        self.used = {}
+        self.used_written = time.time()
+        # the store's size in bytes as of the last re-read plus the writes
+        # since, and the writes since
+        self.bytes = 0
+        self.writes = 0
+
+    def _connect(self):
+        """
+        The connection to the file, opened on first use, or None if it
+        can't be opened.
+        """
+        with self.lock:
+            if self.connection is None and not self.failed:
+                try:
+                    connection = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                        check_same_thread=False)
+                    # readers don't block the writer and the other way round
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.execute("""
+                        CREATE TABLE IF NOT EXISTS results (
+                            key TEXT NOT NULL,
+                            version INTEGER NOT NULL,
+                            value BLOB NOT NULL,
+                            size INTEGER NOT NULL,
+                            used REAL NOT NULL,
+                            PRIMARY KEY (key, version)
+                        )""")
+                    connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+                    self.connection = connection
+                    self.bytes = self._sum_sizes(connection)
+                except (sqlite3.OperationalError, OSError):
+                    print("Can't open the result store at %s, keeping results in memory only" % self.path)
+                    self.failed = True
+            return self.connection
+
+    def get(self, key, version=1):
+        """
+        The result stored for key (a spot_cache key, or any value with a
+        stable repr) by version, or None.
+        """
+        connection = self._connect()
+        if connection is None:
+            return None
+        row = connection.execute("SELECT value FROM results WHERE key = ? AND version = ?",
+            (repr(key), version)).fetchone()
+        if row is None:
+            return None
+        with self.lock:
+            self.used[(repr(key), version)] = time.time()
+        if time.time() - self.used_written >= self.USED_INTERVAL:
+            self.write_used()
+        return pickle.loads(row[0])
+
+    def write_used(self):
+        """
+        Writes when the results read since the last write were read.
+        """
+        connection = self._connect()
+        with self.lock:
+            used, self.used = self.used, {}
+            self.used_written = time.time()
+        if connection is not None and used:
+            connection.executemany("UPDATE results SET used = ? WHERE key = ? AND version = ?",
+                [(when, key, version) for (key, version), when in used.items()])
+
+    def put(self, key, result, version=1):
+        """
+        Stores result for key and version, unless another process already
+        has, then evicts if the store has grown past max_bytes.
+        """
+        connection = self._connect()
+        if connection is None:
+            return
+        value = pickle.dumps(result)
+        try:
+            inserted = connection.execute("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?)",
+                (repr(key), version, value, len(value), time.time())).rowcount
+        except sqlite3.OperationalError:
+            # a read only file, the result is only kept in memory
+            return
+        with self.lock:
+            self.bytes += len(value) * inserted
+            self.writes += 1
+            check = self.writes % self.SIZE_CHECK == 0
+        if check:
+            self.size()
+        if self.bytes > self.max_bytes:
+            self.evict(int(0.9 * self.max_bytes))
+
+    def evict(self, max_bytes):
+        """
+        Deletes the least recently read results until the rest take up at
+        most max_bytes.
+        """
+        self.write_used()
+        connection = self._connect()
+        if connection is None:
+            return
+        connection.execute("""
+            DELETE FROM results WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(size) OVER (ORDER BY used DESC, rowid DESC) AS kept FROM results
+                ) WHERE kept > ?
+            )""", (max_bytes,))
+        self.size()
+
+    def size(self):
+        """
+        Total size of the stored results in bytes (pickled), re-read from
+        the file.
+        """
+        connection = self._connect()
+        if connection is None:
+            return 0
+        size = self._sum_sizes(connection)
+        with self.lock:
+            self.bytes = size
+        return size
+
+    @staticmethod
+    def _sum_sizes(connection):
+        return connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def stats(self):
+        connection = self._connect()
+        if connection is None:
+            return {"entries": 0, "bytes": 0, "max_bytes": self.max_bytes, "open": False}
+        entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "open": True}
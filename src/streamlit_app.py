@@ -7,16 +7,18 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import get_evaluator
 
 from preflop import preflop_monte_carlo
-from hse import hse_1
-from hp import HandPotential_1, HandPotential_2
+from session import hse_1, HandPotentials_1, HandPotentials_2, has_session
 from percentage_rank import percentage_rank
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from odds import mc_odds_calculator
+from odds import exact_odds
+from runner import run_preflop
+import spot_cache
+from background import AnalysisJob
 
 svg_card_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'svg_cards'))
 
@@ -124,6 +126,16 @@ st.markdown("""
 st.markdown('<div class="main-header"><span class="gradient-text">Poker Analytics</span></div>', unsafe_allow_html=True)
 st.markdown('<hr class="thick-divider">', unsafe_allow_html=True)
 
+# the analytics below go through the process wide result cache, so reruns
+# and suit isomorphic spots don't recompute them, and HSE and potentials
+# come from the flop's StreetSession, so adding the turn or river doesn't
+# enumerate the flop again
+preflop_monte_carlo = spot_cache.results.cached(preflop_monte_carlo)
+exact_odds = spot_cache.results.cached(exact_odds)
+hse_1 = spot_cache.results.cached(hse_1)
+HandPotentials_1 = spot_cache.results.cached(HandPotentials_1)
+HandPotentials_2 = spot_cache.results.cached(HandPotentials_2)
+
 def customer_base_page():    
     
     def add_bg_from_url():
@@ -192,7 +204,7 @@ def customer_base_page():
         - Be sure to input the correct card strings to avoid errors.
         - Make sure you don't enter duplicate cards.
         - Experiment with different combinations to understand how hand rankings change as new cards are revealed.
-        - Allow the app to finish running when you make a query - it iterates through 100,000 scenarios for Monte Carlo and the remaining outcomes for 1-card/2-card lookahead potentials.
+        - The hand strength and potentials of a new flop are worked out in the background: a running estimate fills in as the opponent hands are scored and is replaced by the exact numbers when they're done. Changing a card drops the old work.
         - Use the **Reset All** button liberally to try new hands and scenarios.
     
         """        
@@ -431,12 +443,29 @@ def customer_base_page():
                     st.write(f"Losses: {result['losses']}")
                     st.write(f"Ties: {result['ties']}")
                     st.write(f"**Monte Carlo Income Rate:** {result['mc_IR']:.2f}")
+
+                # simulated on all cores; a rerun (any widget change) stops
+                # the script, which drops the jobs that haven't started
+                if st.button("Simulate 2 - 10 players", key="simulate_players"):
+                    bar = st.progress(0.0, text="Simulating...")
+                    sweep = run_preflop(hero_hand, 10, use_table=False,
+                        progress=lambda done, total: bar.progress(done / total, text=f"{done:,} / {total:,} deals"))
+                    bar.empty()
+
+                    fig, ax = plt.subplots(figsize=(6, 4))
+                    ax.plot(range(2, 11), [result['mc_IR'] * 100 for result in sweep], marker='o')
+                    ax.set_xlabel('Number of Players')
+                    ax.set_ylabel('Income Rate')
+                    st.pyplot(fig)
             
             if hero_hand and villain_hand:
                 st.write("### Odds Calculation")
-                hero_win_percentage, villain_win_percentage = mc_odds_calculator(hero_hand, villain_hand)
-                st.write(f"**Hero's Win Percentage:** {hero_win_percentage * 100:.2f}%")
-                st.write(f"**Villain's Win Percentage:** {villain_win_percentage * 100:.2f}%")
+                odds = exact_odds(hero_hand, villain_hand)
+                total = odds['wins'] + odds['losses'] + odds['ties']
+                st.write(f"**Hero's Win Percentage:** {odds['wins'] / total * 100:.2f}%")
+                st.write(f"**Villain's Win Percentage:** {odds['losses'] / total * 100:.2f}%")
+                st.write(f"**Tie Percentage:** {odds['ties'] / total * 100:.2f}%")
+                st.caption(f"Exact over all {total:,} boards.")
 
         with sub_col_2:
             st.subheader("**Villain's Preflop Monte Carlo**")
@@ -450,7 +479,7 @@ def customer_base_page():
                     st.write(f"**Monte Carlo Income Rate:** {result['mc_IR']:.2f}")
         
 
-            evaluator = Evaluator()
+            evaluator = get_evaluator()
 
             if len(board) >=3 and hero_hand and villain_hand and board:
                 st.write("### Hand Rankings")
@@ -513,11 +542,7 @@ def customer_base_page():
 
         st.divider()
         
-        if hero_hand and villain_hand and board:
-            st.write("### Hand Strength Evaluation (HSE)")
-            hse_hero = hse_1(board, hero_hand)
-            hse_villain = hse_1(board, villain_hand)
-
+        def show_hand_strength(hse_hero, hse_villain, potentials, lookahead):
             st.write(f"**Hero's HSE:** {hse_hero['hse']:.2f}")
             st.write(f"Wins: {hse_hero['wins']}, Losses: {hse_hero['losses']}, Ties: {hse_hero['ties']}")
 
@@ -525,74 +550,92 @@ def customer_base_page():
             st.write(f"**Villain's HSE:** {hse_villain['hse']:.2f}")
             st.write(f"Wins: {hse_villain['wins']}, Losses: {hse_villain['losses']}, Ties: {hse_villain['ties']}")
 
-            if not turn_card and river_card:
-                st.markdown("<h3 style='text-align: center; color: purple;'>Make sure you select a turn card before river!</h3>", unsafe_allow_html=True)
-            elif turn_card and not river_card:
-                pp_1, np_1, hero_HPTotal = HandPotential_1(board, hero_hand)
-                pp_2, np_2, villain_HPTotal = HandPotential_1(board, villain_hand)
-                
-                st.write("### Hand Potentials and Effective Hand Strength (EHS)")
+            if potentials is None:
+                return
+            (pp_1, np_1, hero_HPTotal), (pp_2, np_2, villain_HPTotal) = potentials
 
-                col1, col2 = st.columns([1, 1])
-                with col1:
-                    st.write(f"**Hero's Positive Potential - 1 Card Lookahead(Ppot):** {pp_1:.2f}")
-                    st.write(f"**Hero's Negative Potential - 1 Card Lookahead(Npot):** {np_1:.2f}")
-                    st.write(f"**Hero's Effective Hand Strength (EHS):** {hse_hero['hse'] + (1 - hse_hero['hse']) * pp_1}")
-                    st.write(f"**HPTotal:** {hero_HPTotal}")
+            st.write("### Hand Potentials and Effective Hand Strength (EHS)")
 
+            col1, col2 = st.columns([1, 1])
 
-                with col2:
-                    st.write(f"**Villain's Positive Potential - 1 Card Lookahead(Ppot):** {pp_2:.2f}")
-                    st.write(f"**Villain's Negative Potential - 1 Card Lookahead(Npot):** {np_2:.2f}")
-                    st.write(f"**Villain's Effective Hand Strength (EHS):** {hse_villain['hse'] + (1 - hse_villain['hse']) * pp_2}")     
-                    st.write(f"**HPTotal:** {villain_HPTotal}")
-                    
-                st.caption("""
-                **Hand Potentials: 1-Card Lookahead, 2-Card Lookahead, and HPTotal**
+            with col1:
+                st.write(f"**Hero's Positive Potential - {lookahead} Card Lookahead(Ppot):** {pp_1:.2f}")
+                st.write(f"**Hero's Negative Potential - {lookahead} Card Lookahead(Npot):** {np_1:.2f}")
+                st.write(f"**Hero's Effective Hand Strength (EHS):** {hse_hero['hse'] + (1 - hse_hero['hse']) * pp_1}")
+                st.write(f"**HPTotal:** {hero_HPTotal}")
 
-                - **1-Card Lookahead**: Evaluates the potential outcomes if one more community card is dealt. It checks how Hero's and Villain's hands compare after this single card is added, calculating the probability of improving (Ppot) or falling behind (Npot).
 
-                - **2-Card Lookahead**: Looks ahead to the remaining two community cards, predicting how Hero's and Villain's hands might change after both cards are dealt. It provides a more comprehensive view of potential outcomes.
+            with col2:
+                st.write(f"**Villain's Positive Potential - {lookahead} Card Lookahead(Ppot):** {pp_2:.2f}")
+                st.write(f"**Villain's Negative Potential - {lookahead} Card Lookahead(Npot):** {np_2:.2f}")
+                st.write(f"**Villain's Effective Hand Strength (EHS):** {hse_villain['hse'] + (1 - hse_villain['hse']) * pp_2}")
+                st.write(f"**HPTotal:** {villain_HPTotal}")
 
-                - **HPTotal**: Tracks all possible future scenarios, showing how often Hero’s hand is ahead, tied, or behind after considering every potential next card(s). It forms the basis for calculating both Ppot and Npot by summarizing these scenarios.
-                
-                - **Effective Hand Strength:** It is calculated using both Hand Strength and Positive Potential (EHS = HS + (1 − HS ) · Ppot).
-                """)
-                
-            elif not (turn_card and river_card):
-                pp_1, np_1, hero_HPTotal = HandPotential_2(board, hero_hand)
-                pp_2, np_2, villain_HPTotal = HandPotential_2(board, villain_hand)
+            st.caption("""
+            **Hand Potentials: 1-Card Lookahead, 2-Card Lookahead, and HPTotal**
 
-                st.write("### Hand Potentials and Effective Hand Strength (EHS)")
-                
-                col1, col2 = st.columns([1, 1])
-                
-                with col1:
-                    st.write(f"**Hero's Positive Potential - 2 Card Lookahead(Ppot):** {pp_1:.2f}")
-                    st.write(f"**Hero's Negative Potential - 2 Card Lookahead(Npot):** {np_1:.2f}")
-                    st.write(f"**Hero's Effective Hand Strength (EHS):** {hse_hero['hse'] + (1 - hse_hero['hse']) * pp_1}")
-                    st.write(f"**HPTotal:** {hero_HPTotal}")
+            - **1-Card Lookahead**: Evaluates the potential outcomes if one more community card is dealt. It checks how Hero's and Villain's hands compare after this single card is added, calculating the probability of improving (Ppot) or falling behind (Npot).
 
+            - **2-Card Lookahead**: Looks ahead to the remaining two community cards, predicting how Hero's and Villain's hands might change after both cards are dealt. It provides a more comprehensive view of potential outcomes.
 
-                with col2:
-                    st.write(f"**Villain's Positive Potential - 2 Card Lookahead(Ppot):** {pp_2:.2f}")
-                    st.write(f"**Villain's Negative Potential - 2 Card Lookahead(Npot):** {np_2:.2f}")
-                    st.write(f"**Villain's Effective Hand Strength (EHS):** {hse_villain['hse'] + (1 - hse_villain['hse']) * pp_2}")
-                    st.write(f"**HPTotal:** {villain_HPTotal}")
+            - **HPTotal**: Tracks all possible future scenarios, showing how often Hero’s hand is ahead, tied, or behind after considering every potential next card(s). It forms the basis for calculating both Ppot and Npot by summarizing these scenarios.
+            
+            - **Effective Hand Strength:** It is calculated using both Hand Strength and Positive Potential (EHS = HS + (1 − HS ) · Ppot).
+            """)
+
+        # polled until the background job is done, then the page is rerun
+        # for the exact results, which are quick by then
+        @st.fragment(run_every=0.5)
+        def show_running_estimate(job):
+            if job.done():
+                if job.error() is not None:
+                    st.error(f"Couldn't work out the hand strength: {job.error()}")
+                    return
+                st.rerun()
 
-                st.caption("""
-                **Hand Potentials: 1-Card Lookahead, 2-Card Lookahead, and HPTotal**
+            partial = job.partial
+            if partial is None:
+                st.progress(0.0, text="Scoring the hands on this flop...")
+                return
+            st.progress(partial['scored'], text=f"Running estimate from {partial['scored']:.0%} of the opponent hands")
+            show_hand_strength(*partial['hse'], partial['potentials'], job.lookahead)
+
+        if turn_card and not river_card:
+            lookahead = 1
+        elif not (turn_card or river_card):
+            lookahead = 2
+        else:
+            lookahead = 0
+        potentials_of = {1: HandPotentials_1, 2: HandPotentials_2}.get(lookahead)
 
-                - **1-Card Lookahead**: Evaluates the potential outcomes if one more community card is dealt. It checks how Hero's and Villain's hands compare after this single card is added, calculating the probability of improving (Ppot) or falling behind (Npot).
+        # a job for cards that have since changed is stale
+        job = st.session_state.get('analysis_job')
+        if job is not None and not (hero_hand and villain_hand and board
+                and job.is_for(board, [hero_hand, villain_hand], lookahead)):
+            job.cancel()
+            del st.session_state['analysis_job']
 
-                - **2-Card Lookahead**: Looks ahead to the remaining two community cards, predicting how Hero's and Villain's hands might change after both cards are dealt. It provides a more comprehensive view of potential outcomes.
+        if hero_hand and villain_hand and board:
+            st.write("### Hand Strength Evaluation (HSE)")
 
-                - **HPTotal**: Tracks all possible future scenarios, showing how often Hero’s hand is ahead, tied, or behind after considering every potential next card(s). It forms the basis for calculating both Ppot and Npot by summarizing these scenarios.
-                
-                - **Effective Hand Strength:** It is calculated using both Hand Strength and Positive Potential (EHS = HS + (1 − HS ) · Ppot).
-                """)
+            cached = [hse_1.peek(board, hero_hand), hse_1.peek(board, villain_hand)]
+            if potentials_of is not None:
+                cached.append(potentials_of.peek(board, [hero_hand, villain_hand]))
 
+            if has_session(board) or all(result is not None for result in cached):
+                show_hand_strength(hse_1(board, hero_hand), hse_1(board, villain_hand),
+                    potentials_of(board, [hero_hand, villain_hand]) if potentials_of is not None else None,
+                    lookahead)
             else:
+                job = st.session_state.get('analysis_job')
+                if job is None or job.done():
+                    job = AnalysisJob(board, [hero_hand, villain_hand], lookahead)
+                    st.session_state['analysis_job'] = job
+                show_running_estimate(job)
+
+            if not turn_card and river_card:
+                st.markdown("<h3 style='text-align: center; color: purple;'>Make sure you select a turn card before river!</h3>", unsafe_allow_html=True)
+            elif turn_card and river_card:
                 st.markdown("<h3 style='text-align: center; color: blue;'>Make sure turn and river are not both selected to see positive potentials 1 and 2.</h3>", unsafe_allow_html=True)
         
         st.session_state['hero_card1'] = hero_card1
@@ -606,6 +649,13 @@ def customer_base_page():
         st.session_state['river_card'] = river_card
         
         st.divider()
+
+    cache_stats = spot_cache.results.stats()
+    store_stats = spot_cache.results.store.stats()
+    st.sidebar.caption(f"Result cache: {cache_stats['hit_rate']:.0%} hit rate ({cache_stats['hits']} + "
+        f"{cache_stats['store_hits']} from disk of {cache_stats['hits'] + cache_stats['store_hits'] + cache_stats['misses']} "
+        f"lookups), {cache_stats['entries']} results, {cache_stats['bytes'] / 1024:.1f} KiB; "
+        f"on disk {store_stats['entries']} results, {store_stats['bytes'] / 1024:.1f} KiB")
     
 def dashboard():    
     def add_bg_from_url():
@@ -702,12 +752,12 @@ def dashboard():
     st.divider()
         
     def calculate_hand_strength(board, hand):
-        evaluator = Evaluator()
+        evaluator = get_evaluator()
         hand_strength = evaluator.evaluate(board, hand)
         return hand_strength
 
     def real_time_hand_strength(hero_hand, villain_hand, board):
-        evaluator = Evaluator()
+        evaluator = get_evaluator()
 
         hero_strengths = []
         villain_strengths = []
@@ -838,8 +888,11 @@ def dashboard():
     
     st.divider()
 
-if st.session_state.page == "Poker Hand Data":
-    customer_base_page()
-elif st.session_state.page == "Dashboard":
-    dashboard()
+# streamlit runs this script as __main__; the worker processes started for
+# runner's pool import it as __mp_main__ and mustn't draw the pages
+if __name__ == "__main__":
+    if st.session_state.page == "Poker Hand Data":
+        customer_base_page()
+    elif st.session_state.page == "Dashboard":
+        dashboard()
     
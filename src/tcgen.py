@@ -1,6 +1,6 @@
 from deuces.card import Card
 from deuces.deck import Deck
-from deuces.evaluator import Evaluator
+from deuces.evaluator import get_evaluator
 from hse.mc_preflop import preflop_monte_carlo
 from hse.hse_1 import hse_1
 from hse.hand_potential_1 import HandPotential_1
@@ -10,7 +10,7 @@ from hse.odds import mc_odds_calculator
 import pandas as pd
 
 deck = Deck()
-evaluator = Evaluator()
+evaluator = get_evaluator()
 num_opps = 1
 
 c1 = 'Tc'
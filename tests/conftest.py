@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the repo root for deuces, src for the analytics modules, as the app does
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
@@ -0,0 +1,19 @@
+from deuces.card import Card
+import spot_cache
+from background import AnalysisJob
+from session import StreetSession
+
+def _cards(cards):
+    return [Card.new(card) for card in cards.split()]
+
+def test_running_estimate_survives_hands_all_ahead(monkeypatch):
+    # the first chunk of opponent hands on this flop are all ahead of hero,
+    # so hero's Npot has nothing to go on yet
+    monkeypatch.setattr(spot_cache.results, 'store', None)
+    board = _cards('8s As 8d')
+    hands = [_cards('2s 3s'), _cards('Kc Qd')]
+    job = AnalysisJob(board, hands, 2)
+    assert job.future.result()
+    assert job.error() is None
+    assert job.partial["scored"] == 1
+    assert job.partial["potentials"] == StreetSession(board).HandPotentials_2(board, hands)
@@ -0,0 +1,36 @@
+import itertools
+import numpy as np
+import pytest
+from deuces.deck import Deck
+from deuces.evaluator import get_evaluator
+
+evaluator = get_evaluator()
+
+def _hands(size, count=20000, seed=0):
+    # a seeded sample of count hands of size cards
+    deck = np.array(Deck.GetFullDeck())
+    rng = np.random.default_rng(seed)
+    return np.array([rng.choice(deck, size, replace=False) for _ in range(count)])
+
+def _subsets(cards):
+    # the old 6 and 7 card evaluation: the best of every 5 card subset
+    return min(evaluator._five(list(subset)) for subset in itertools.combinations(cards, 5))
+
+@pytest.mark.parametrize("size", [5, 6, 7])
+def test_evaluate_matches_five_card_subsets(size):
+    for hand in _hands(size).tolist():
+        assert evaluator.evaluate(hand[:2], hand[2:]) == _subsets(hand)
+
+@pytest.mark.parametrize("size", [5, 6, 7])
+def test_evaluate_batch_matches_evaluate(size):
+    hands = _hands(size, seed=size)
+    ranks = evaluator.evaluate_batch(hands)
+    assert ranks.tolist() == [evaluator.evaluate(hand[:2], hand[2:]) for hand in hands.tolist()]
+
+def test_evaluate_boards_matches_evaluate():
+    hands = _hands(7, count=2000, seed=1)
+    boards = hands[:, 2:]
+    for hand in hands[:20].tolist():
+        live = ~np.isin(boards, hand).any(axis=1)
+        ranks = evaluator.evaluate_boards(boards[live], [hand[:2]])[0]
+        assert ranks.tolist() == [evaluator.evaluate(hand[:2], board) for board in boards[live].tolist()]
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import math
+import numpy as np
+import pytest
+from deuces.card import Card
+import hse
+
+def _cards(cards):
+    return [Card.new(card) for card in cards.split()]
+
+def _hse_n(board, hand, opponents):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return hse.hse_n(_cards(board), _cards(hand), opponents)
+
+def _hand_sets(board, hand):
+    # the opponent hands worse than hand and those not better, as card masks
+    opphands, ranks, _ = hse._opponent_ranks(_cards(board), _cards(hand))
+    score = hse.evaluator.evaluate(_cards(board), _cards(hand))
+    masks = (np.int64(1) << opphands[:, 0]) | (np.int64(1) << opphands[:, 1])
+    return masks[ranks > score], masks[ranks >= score]
+
+def _ordered_triples(masks):
+    # ordered triples of hands that share no card: trace(D^3), D[a, b] being
+    # whether hands a and b are disjoint
+    disjoint = ((masks[:, None] & masks[None, :]) == 0).astype(np.float64)
+    return int(round(np.trace(disjoint @ disjoint @ disjoint)))
+
+def _ordered_deals(masks, opponents):
+    # every set of opponents disjoint hands, one at a time, times its orders
+    masks = masks.tolist()
+
+    def sets(start, used, left):
+        if left == 0:
+            return 1
+        return sum(sets(i + 1, used | mask, left - 1)
+            for i, mask in enumerate(masks[start:], start) if not used & mask)
+
+    return sets(0, 0, opponents) * math.factorial(opponents)
+
+# flush and straight boards, where the cards don't merge into few types,
+# and boards without either
+SPOTS = [
+    ('4d 3h 6d 8d', '7s 4c'),
+    ('6c 5c 6h 3c', 'Td 3s'),
+    ('6h 2d 2h 7c 9h', '9s Ts'),
+    ('Ks Qs Th', 'Js 9s'),
+    ('As Ks Qs', 'Tc 8d'),
+    ('Th 8h 6h', '2s 3c'),
+    ('Jd 5h Ah 2d Jh', '6c 6s'),
+    ('4c 3h 6d 8s', '7s 4d'),
+    ('Ah Kh Qs 9d 2c', '8c 4d'),
+]
+
+@pytest.mark.parametrize("board, hand", SPOTS)
+def test_three_opponents_match_direct_count(board, hand):
+    worse, not_better = _hand_sets(board, hand)
+    result = _hse_n(board, hand, 3)
+    assert result["wins"] == _ordered_triples(worse)
+    assert result["wins"] + result["ties"] == _ordered_triples(not_better)
+
+@pytest.mark.parametrize("board, hand", [('Jh Th 9h 2c', '5d 4d'), ('Ah Kh 7h 9d 2h', '8c 5d')])
+@pytest.mark.parametrize("opponents", [4, 5])
+def test_more_opponents_match_brute_force(board, hand, opponents):
+    worse, not_better = _hand_sets(board, hand)
+    result = _hse_n(board, hand, opponents)
+    assert result["wins"] == _ordered_deals(worse, opponents)
+    assert result["wins"] + result["ties"] == _ordered_deals(not_better, opponents)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matchings_match_brute_force_on_small_graphs(seed):
+    # random hands on 12 cards, any of them special
+    rng = np.random.default_rng(seed)
+    pairs = np.array([(a, b) for a in range(12) for b in range(a + 1, 12)])
+    opphands = pairs[rng.random(len(pairs)) < rng.uniform(0.2, 0.8)]
+    special = sorted(rng.choice(12, rng.integers(0, 7), replace=False).tolist())
+    masks = (np.int64(1) << opphands[:, 0]) | (np.int64(1) << opphands[:, 1])
+    for opponents in (3, 4, 5):
+        assert (hse._matchings(opphands, 12, opponents, special) * math.factorial(opponents)
+            == _ordered_deals(masks, opponents))